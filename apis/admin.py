@@ -1,7 +1,50 @@
 from django.contrib import admin
-from .models import ExpenseShare,Expense
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .export_jobs import download_name
+from .models import ExpenseShare,Expense,ExportJob,RecurringExpense,UserBalance
 
 # Register your models here.
 
 admin.site.register(Expense)
-admin.site.register(ExpenseShare)
\ No newline at end of file
+admin.site.register(ExpenseShare)
+admin.site.register(UserBalance)
+admin.site.register(RecurringExpense)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'format', 'requested_by', 'status', 'rows_written', 'created_at', 'expires_at',
+                    'download_link')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('requested_by', 'kind', 'format', 'filters', 'fingerprint', 'status', 'rows_written',
+                       'total_rows', 'file', 'error', 'created_at', 'finished_at', 'expires_at', 'download_link')
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<uuid:object_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='apis_exportjob_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, object_id):
+        job = get_object_or_404(ExportJob, pk=object_id)
+        if not self.has_view_permission(request, job):
+            raise PermissionDenied
+        if job.status != ExportJob.StatusChoices.DONE:
+            raise Http404('Export is not ready')
+        filename, content_type = download_name(job)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=filename, content_type=content_type)
+
+    @admin.display(description='Download')
+    def download_link(self, job):
+        if job.status != ExportJob.StatusChoices.DONE:
+            return '-'
+        return format_html('<a href="{}">{}</a>', reverse('admin:apis_exportjob_download', args=[job.pk]),
+                           download_name(job)[0])
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apis'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from .search import repair_search_index
+
+        post_migrate.connect(repair_search_index, sender=self, dispatch_uid='apis.repair_search_index')
@@ -0,0 +1,109 @@
+from functools import wraps
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, ParseError
+from rest_framework.renderers import JSONRenderer
+
+from daily_expense_sharing.routers import route_reads_to_replica
+from users.authentication import CachedJWTAuthentication
+from .balances import acompute_balances
+from .filters import expense_filter
+from .models import Expense, ExpenseShare, UserBalance
+from .pagination import ExpenseShareKeysetPagination, KeysetPagination
+from .serializers import ExpenseSerializer, ExpenseShareSerializer, UserBalanceSerializer, parse_field_list
+from .views import expense_read_queryset, settlement_payload
+
+authenticator = CachedJWTAuthentication()
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def async_read_view(view):
+    """
+    Authenticate an async GET view with ``CachedJWTAuthentication`` and turn API
+    exceptions into JSON error responses, as DRF does for the sync viewset.
+
+    Views wrapped with this return the same payloads as their ``ExpenseViewSet``
+    counterparts, but under ASGI they only leave the event loop for their
+    database queries instead of holding a worker thread for the whole request.
+    """
+    @require_GET
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            credentials = await authenticator.aauthenticate(request)
+            if credentials is None:
+                raise NotAuthenticated()
+            request.user, request.auth = credentials
+            route_reads_to_replica()
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            response = json_response(detail, status=exc.status_code)
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+    return wrapper
+
+
+def serializer_context(request):
+    return {
+        'request': request,
+        'fields': parse_field_list(request.GET.get('fields')),
+        'expand': parse_field_list(request.GET.get('expand')),
+    }
+
+
+def filtered(queryset, request):
+    prefix = '' if queryset.model is Expense else 'expense__'
+    try:
+        return queryset.filter(expense_filter(request.GET, prefix=prefix))
+    except ValueError as e:
+        raise ParseError(str(e))
+
+
+@async_read_view
+async def expense_list(request):
+    context = serializer_context(request)
+    expenses = expense_read_queryset(filtered(Expense.objects.all(), request), context['fields'], context['expand'])
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(expenses, request)
+    return json_response(paginator.get_paginated_data(ExpenseSerializer(page, many=True, context=context).data))
+
+
+@async_read_view
+async def expense_detail(request, pk):
+    context = serializer_context(request)
+    try:
+        expense = await expense_read_queryset(Expense.objects.all(), context['fields'], context['expand']).aget(pk=pk)
+    except Expense.DoesNotExist:
+        raise NotFound()
+    return json_response(ExpenseSerializer(expense, context=context).data)
+
+
+@async_read_view
+async def my_expenses(request):
+    context = serializer_context(request)
+    shares = filtered(ExpenseShare.objects.filter(user=request.user), request).select_related('expense')
+    if context['expand'] is None or 'user' in context['expand']:
+        shares = shares.select_related('user')
+    paginator = ExpenseShareKeysetPagination()
+    page = await paginator.apaginate_queryset(shares, request)
+    return json_response(paginator.get_paginated_data(ExpenseShareSerializer(page, many=True, context=context).data))
+
+
+@async_read_view
+async def my_balance(request):
+    try:
+        balance = await UserBalance.objects.aget(pk=request.user.pk)
+    except UserBalance.DoesNotExist:
+        balance = UserBalance(user=request.user)
+    return json_response(UserBalanceSerializer(balance).data)
+
+
+@async_read_view
+async def settlements(request):
+    return json_response(settlement_payload(await acompute_balances()))
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Expense, ExpenseShare, UserBalance
+
+
+def expense_deltas(entries, sign=1, deltas=None):
+    """
+    Accumulate per-user ``[paid, owed]`` changes, in cents, for ``(expense, shares)`` pairs.
+
+    The creator of an expense is treated as the payer of its total amount and
+    every share is owed by the share's user. Pass ``sign=-1`` to reverse an
+    expense that is being changed or removed.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0])
+    for expense, shares in entries:
+        deltas[expense.created_by_id][0] += sign * expense.total_amount_cents
+        for share in shares:
+            deltas[share.user_id][1] += sign * share.amount_cents
+    return deltas
+
+
+def apply_deltas(deltas):
+    """
+    Add ``deltas`` to the stored balances with a single upsert statement.
+
+    Must run inside the transaction that writes the expenses themselves.
+    """
+    user_field = UserBalance._meta.get_field('user')
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = [
+        (user_field.get_db_prep_value(user_id, connection), paid, owed, paid - owed, now)
+        for user_id, (paid, owed) in deltas.items() if paid or owed
+    ]
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(UserBalance._meta.db_table)
+    updates = ', '.join(f'{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}'
+                        for column in ('total_paid_cents', 'total_owed_cents', 'net_cents'))
+    sql = (
+        f'INSERT INTO {table} ({qn("user_id")}, {qn("total_paid_cents")}, {qn("total_owed_cents")}, '
+        f'{qn("net_cents")}, {qn("updated_at")}) VALUES (%s, %s, %s, %s, %s) '
+        f'ON CONFLICT ({qn("user_id")}) DO UPDATE SET {updates}, {qn("updated_at")} = excluded.{qn("updated_at")}'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _grouped_totals():
+    """
+    Return the ``(user_id, total_cents)`` querysets of amounts paid and of amounts owed.
+    """
+    return (
+        Expense.objects.values_list('created_by').annotate(total=Sum('total_amount_cents')).order_by(),
+        ExpenseShare.objects.values_list('user').annotate(total=Sum('amount_cents')).order_by(),
+    )
+
+
+def compute_balances():
+    """
+    Recompute every user's ``[paid, owed]`` totals, in cents, from the expense tables.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for index, queryset in enumerate(_grouped_totals()):
+        for user_id, total in queryset:
+            totals[user_id][index] = total or 0
+    return totals
+
+
+async def acompute_balances():
+    """
+    Async counterpart of ``compute_balances``.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for index, queryset in enumerate(_grouped_totals()):
+        async for user_id, total in queryset:
+            totals[user_id][index] = total or 0
+    return totals
+
+
+def find_drift():
+    """
+    Return ``(user_id, stored, expected)`` tuples for balances that disagree with the expense tables.
+    """
+    expected = compute_balances()
+    stored = {balance.user_id: balance for balance in UserBalance.objects.iterator()}
+    drift = []
+    for user_id in set(expected) | set(stored):
+        paid, owed = expected.get(user_id, (0, 0))
+        balance = stored.get(user_id)
+        current = (balance.total_paid_cents, balance.total_owed_cents, balance.net_cents) if balance else (0, 0, 0)
+        if current != (paid, owed, paid - owed):
+            drift.append((user_id, current, (paid, owed, paid - owed)))
+    return drift
+
+
+@transaction.atomic
+def rebuild_balances():
+    UserBalance.objects.all().delete()
+    balances = [
+        UserBalance(user_id=user_id, total_paid_cents=paid, total_owed_cents=owed, net_cents=paid - owed)
+        for user_id, (paid, owed) in compute_balances().items()
+    ]
+    UserBalance.objects.bulk_create(balances, batch_size=1000)
+    return len(balances)
@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.exceptions import APIException
+
+
+def collection_validators(queryset, updated_field):
+    """
+    Return ``(last_modified, count)`` for a queryset with one aggregate query.
+
+    The row count catches deletions that leave the newest timestamp unchanged.
+    """
+    stats = queryset.order_by().aggregate(last_modified=Max(updated_field), count=Count('pk'))
+    return stats['last_modified'], stats['count']
+
+
+def conditional_get(view_method):
+    """
+    Answer ``If-None-Match`` / ``If-Modified-Since`` on a viewset action before the
+    view runs, using the ``(queryset, updated_field)`` pair returned by the
+    viewset's ``get_validator_queryset()``. Successful responses carry the
+    ``ETag`` and ``Last-Modified`` headers that later requests revalidate against.
+
+    Collections only get an ``ETag``: deleting a row that is not the newest leaves
+    their last-modified time unchanged, so ``If-Modified-Since`` would answer 304
+    with stale data.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+        try:
+            queryset, updated_field = self.get_validator_queryset()
+            last_modified, count = collection_validators(queryset, updated_field)
+        except (ValueError, APIException):
+            # Malformed lookups or filters; let the view report the error.
+            return view_method(self, request, *args, **kwargs)
+
+        variant = f"{request.user.pk}|{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        etag = quote_etag(hashlib.md5(
+            f"{last_modified.isoformat() if last_modified else ''}|{count}|{variant}".encode()
+        ).hexdigest())
+        last_modified_ts = int(last_modified.timestamp()) if last_modified and self.detail else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if response is not None:
+            return response
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified_ts is not None:
+                response['Last-Modified'] = http_date(last_modified_ts)
+        return response
+    return wrapper
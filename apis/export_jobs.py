@@ -0,0 +1,216 @@
+import hashlib
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .conditional import collection_validators
+from .exports import (
+    BALANCE_SHEET_FIELDS, BALANCE_SHEET_HEADERS, CONTENT_TYPES, MY_BALANCE_SHEET_FIELDS, MY_BALANCE_SHEET_HEADERS,
+    balance_sheet_rows, export_stream, my_balance_sheet_rows
+)
+from .filters import expense_filter
+from .models import ExportJob, ExpenseShare
+from .statements import generate_statements
+
+# kind: (download basename, sheet title, headers, fields)
+EXPORTS = {
+    ExportJob.KindChoices.BALANCE_SHEET: ('balance_sheet', "Balance Sheet", BALANCE_SHEET_HEADERS,
+                                          BALANCE_SHEET_FIELDS),
+    ExportJob.KindChoices.MY_BALANCE_SHEET: ('my_expense_sheet', "My Expense Sheet", MY_BALANCE_SHEET_HEADERS,
+                                             MY_BALANCE_SHEET_FIELDS),
+    ExportJob.KindChoices.STATEMENTS: ('statements', "Statements", None, None),
+}
+
+PROGRESS_EVERY = 5000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.EXPORT_JOB_WORKERS, thread_name_prefix='export-job')
+        return _executor
+
+
+def export_shares(user, kind, filters):
+    """
+    Return the shares an export of ``kind`` reads.
+    """
+    filters = dict(filters)
+    user_ids = filters.pop('user_ids', None)
+    shares = ExpenseShare.objects.filter(expense_filter(filters, prefix='expense__'))
+    if kind == ExportJob.KindChoices.MY_BALANCE_SHEET:
+        return shares.filter(user=user)
+    if user_ids is not None:
+        return shares.filter(user_id__in=user_ids)
+    return shares
+
+
+def export_fingerprint(user, kind, fmt, filters):
+    """
+    Hash the export parameters together with the newest ``updated_at`` and the
+    count of the shares the export reads, so any write that changes them, made
+    by any process, gives the export a new fingerprint.
+    """
+    last_modified, count = collection_validators(export_shares(user, kind, filters), 'expense__updated_at')
+    payload = json.dumps([kind, fmt, filters, last_modified.isoformat() if last_modified else None, count],
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_export(user, kind, fmt, filters):
+    """
+    Return ``(job, created)`` for an export, reusing a pending or running job
+    younger than ``EXPORT_JOB_TIMEOUT`` or an unexpired finished job with the same fingerprint.
+
+    New jobs are handed to the worker pool once the surrounding transaction commits.
+    """
+    fail_stale_exports()
+    purge_expired_exports()
+    fingerprint = export_fingerprint(user, kind, fmt, filters)
+    job = ExportJob.objects.filter(
+        Q(status=ExportJob.StatusChoices.DONE, expires_at__gt=timezone.now())
+        | Q(status__in=[ExportJob.StatusChoices.PENDING, ExportJob.StatusChoices.RUNNING],
+            created_at__gt=timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)),
+        requested_by=user, fingerprint=fingerprint,
+    ).order_by('-created_at').first()
+    if job is not None:
+        return job, False
+
+    job = ExportJob.objects.create(requested_by=user, kind=kind, format=fmt, filters=filters, fingerprint=fingerprint)
+    transaction.on_commit(lambda: submit_export(job.pk))
+    return job, True
+
+
+def request_statements(user, user_ids, fmt=ExportJob.FormatChoices.XLSX):
+    """
+    Queue a zip of statements for ``user_ids`` (every user with expenses when None), deduplicated like other exports.
+    """
+    filters = {} if user_ids is None else {'user_ids': sorted(str(user_id) for user_id in user_ids)}
+    return request_export(user, ExportJob.KindChoices.STATEMENTS, fmt, filters)
+
+
+def download_name(job):
+    """
+    Return the ``(filename, content type)`` a finished job is served with.
+    """
+    basename = EXPORTS[job.kind][0]
+    if job.kind == ExportJob.KindChoices.STATEMENTS:
+        return f'{basename}.zip', 'application/zip'
+    return f'{basename}.{job.format}', CONTENT_TYPES[job.format]
+
+
+def submit_export(job_id):
+    """
+    Run the job on the worker pool, or inline when ``EXPORT_JOB_WORKERS`` is 0.
+    """
+    if not settings.EXPORT_JOB_WORKERS:
+        run_export_job(job_id)
+        return
+    executor().submit(_run_in_worker, job_id)
+
+
+def _run_in_worker(job_id):
+    try:
+        run_export_job(job_id)
+    finally:
+        # Worker threads open their own connections; don't leave them behind.
+        connections.close_all()
+
+
+def _counted(rows, job_id):
+    written = 0
+    for row in rows:
+        yield row
+        written += 1
+        if written % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job_id).update(rows_written=written)
+
+
+def run_export_job(job_id):
+    """
+    Build a pending job's file into the default storage and record the outcome on the job.
+    """
+    if not ExportJob.objects.filter(pk=job_id, status=ExportJob.StatusChoices.PENDING).update(
+            status=ExportJob.StatusChoices.RUNNING):
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    basename, title, headers, fields = EXPORTS[job.kind]
+    try:
+        if job.kind == ExportJob.KindChoices.STATEMENTS:
+            filters = dict(job.filters)
+            user_ids = filters.pop('user_ids', None)
+            # Progress counts share rows, as for the balance sheets.
+            shares = ExpenseShare.objects.filter(expense_filter(filters, prefix='expense__'))
+            if user_ids is not None:
+                shares = shares.filter(user_id__in=user_ids)
+            ExportJob.objects.filter(pk=job_id).update(total_rows=shares.count())
+            with tempfile.TemporaryFile() as output:
+                total = generate_statements(output, job.format, settings.STATEMENT_WORKERS, filters=filters,
+                                            user_ids=user_ids)['rows']
+                output.seek(0)
+                job.file.save(f'{basename}-{job.pk}.zip', File(output), save=False)
+        else:
+            shares = ExpenseShare.objects.filter(expense_filter(job.filters, prefix='expense__'))
+            if job.kind == ExportJob.KindChoices.MY_BALANCE_SHEET:
+                total = shares.filter(user_id=job.requested_by_id).count()
+                rows = my_balance_sheet_rows(job.requested_by_id, shares)
+            else:
+                total = shares.count()
+                rows = balance_sheet_rows(shares)
+            ExportJob.objects.filter(pk=job_id).update(total_rows=total)
+
+            with tempfile.TemporaryFile() as output:
+                for chunk in export_stream(job.format, title, headers, fields, _counted(rows, job_id)):
+                    output.write(chunk)
+                output.seek(0)
+                job.file.save(f'{basename}-{job.pk}.{job.format}', File(output), save=False)
+    except Exception as e:
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job_id).update(status=ExportJob.StatusChoices.FAILED, error=str(e), finished_at=now,
+                                                   expires_at=now + timedelta(seconds=settings.EXPORT_JOB_TTL))
+        return
+
+    now = timezone.now()
+    ExportJob.objects.filter(pk=job_id).update(
+        status=ExportJob.StatusChoices.DONE, file=job.file.name, rows_written=total, finished_at=now,
+        expires_at=now + timedelta(seconds=settings.EXPORT_JOB_TTL),
+    )
+
+
+def fail_stale_exports():
+    """
+    Mark pending and running jobs older than ``EXPORT_JOB_TIMEOUT`` as failed.
+
+    Jobs only live in the worker pool of the process that queued them, so after
+    a restart or a crashed worker nothing will ever finish them.
+    """
+    now = timezone.now()
+    return ExportJob.objects.filter(
+        status__in=[ExportJob.StatusChoices.PENDING, ExportJob.StatusChoices.RUNNING],
+        created_at__lte=now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+    ).update(status=ExportJob.StatusChoices.FAILED, error='Export did not finish in time', finished_at=now,
+             expires_at=now + timedelta(seconds=settings.EXPORT_JOB_TTL))
+
+
+def purge_expired_exports():
+    """
+    Delete expired jobs and their files.
+    """
+    expired = list(ExportJob.objects.filter(expires_at__lte=timezone.now()))
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    ExportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
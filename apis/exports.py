@@ -0,0 +1,138 @@
+import csv
+import json
+import tempfile
+
+from django.http import StreamingHttpResponse
+from openpyxl.workbook import Workbook
+
+from .models import ExpenseShare
+from .money import cents_to_decimal
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ITERATOR_CHUNK_SIZE = 2000
+STREAM_CHUNK_SIZE = 64 * 1024
+ROWS_PER_CHUNK = 500
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'ndjson')
+
+BALANCE_SHEET_HEADERS = [
+    "Expense Description", "Total Amount", "Split Method", "Created By",
+    "User", "Amount", "Percentage"
+]
+BALANCE_SHEET_FIELDS = [
+    'description', 'total_amount', 'split_method', 'created_by', 'user', 'amount', 'percentage'
+]
+
+MY_BALANCE_SHEET_HEADERS = [
+    "Expense Description", "Total Amount", "Split Method", "Created By",
+    "Amount", "Percentage"
+]
+MY_BALANCE_SHEET_FIELDS = [
+    'description', 'total_amount', 'split_method', 'created_by', 'amount', 'percentage'
+]
+
+
+def with_amounts(rows, columns):
+    """
+    Convert the integer cents in the ``columns`` of each row to decimal amounts.
+    """
+    for row in rows:
+        row = list(row)
+        for column in columns:
+            row[column] = cents_to_decimal(row[column])
+        yield row
+
+
+def balance_sheet_rows(queryset=None):
+    """
+    Yield one row per expense share from a single joined query, reading the
+    results in chunks instead of loading every share into memory.
+    """
+    if queryset is None:
+        queryset = ExpenseShare.objects.all()
+    return with_amounts(queryset.order_by('expense_id', 'id').values_list(
+        'expense__description', 'expense__total_amount_cents', 'expense__split_method', 'expense__created_by__email',
+        'user__email', 'amount_cents', 'percentage'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE), (1, 5))
+
+
+def my_balance_sheet_rows(user, queryset=None):
+    if queryset is None:
+        queryset = ExpenseShare.objects.all()
+    return with_amounts(queryset.filter(user=user).order_by('expense_id', 'id').values_list(
+        'expense__description', 'expense__total_amount_cents', 'expense__split_method', 'expense__created_by__email',
+        'amount_cents', 'percentage'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE), (1, 4))
+
+
+def xlsx_stream(title, headers, rows):
+    """
+    Build a workbook in openpyxl's write-only mode and yield the saved file in chunks.
+
+    Write-only worksheets spool rows to a temporary file as they are appended and
+    the archive is saved to another temporary file, so memory use does not grow
+    with the number of rows.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as buffer:
+        workbook.save(buffer)
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(STREAM_CHUNK_SIZE), b'')
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _batched(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def csv_stream(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers).encode('utf-8')
+    yield from _batched(writer.writerow(row) for row in rows)
+
+
+def ndjson_stream(fields, rows):
+    yield from _batched(json.dumps(dict(zip(fields, row)), default=str) + '\n' for row in rows)
+
+
+CONTENT_TYPES = {'xlsx': XLSX_CONTENT_TYPE, 'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def export_stream(fmt, title, headers, fields, rows):
+    """
+    Return the chunks of ``rows`` encoded in ``fmt``, one of ``EXPORT_FORMATS``.
+    """
+    if fmt == 'csv':
+        return csv_stream(headers, rows)
+    if fmt == 'ndjson':
+        return ndjson_stream(fields, rows)
+    return xlsx_stream(title, headers, rows)
+
+
+def export_response(fmt, basename, title, headers, fields, rows):
+    """
+    Stream ``rows`` as an attachment in one of ``EXPORT_FORMATS``.
+    """
+    if fmt not in CONTENT_TYPES:
+        fmt = 'xlsx'
+    content, content_type = export_stream(fmt, title, headers, fields, rows), CONTENT_TYPES[fmt]
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename={basename}.{fmt}'
+    return response
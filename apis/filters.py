@@ -0,0 +1,110 @@
+from datetime import datetime, time, timedelta
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Expense
+from .money import to_cents
+from .splits import parse_user_id
+
+
+FILTER_PARAMS = ('created_after', 'created_before', 'created_by', 'split_method', 'min_amount', 'max_amount')
+
+
+def parse_moment(value, name, end_of_day=False):
+    """
+    Parse an ISO date or datetime query parameter into an aware datetime.
+
+    A bare date means the start of that day, or the start of the next day when
+    ``end_of_day`` is set so that the filter covers the whole day.
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError
+            if end_of_day:
+                day += timedelta(days=1)
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 date or datetime')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_amount(value, name, rounding):
+    """
+    Parse an amount query parameter into integer cents, rounding sub-cent values with ``rounding``.
+    """
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if not amount.is_finite():
+        raise ValueError(f'{name} must be a number')
+    return to_cents(amount, name, rounding)
+
+
+def expense_filter(params, prefix=''):
+    """
+    Build a Q object from the expense filter query parameters.
+
+    ``prefix`` is the lookup path to the expense, e.g. ``'expense__'`` when
+    filtering ExpenseShare rows. Raises ValueError for malformed parameters.
+    """
+    query = Q()
+
+    created_after = params.get('created_after')
+    if created_after:
+        query &= Q(**{f'{prefix}created_at__gte': parse_moment(created_after, 'created_after')})
+
+    created_before = params.get('created_before')
+    if created_before:
+        moment = parse_moment(created_before, 'created_before', end_of_day=True)
+        if parse_datetime(created_before) is None:
+            query &= Q(**{f'{prefix}created_at__lt': moment})
+        else:
+            query &= Q(**{f'{prefix}created_at__lte': moment})
+
+    created_by = params.get('created_by')
+    if created_by:
+        user_id = parse_user_id(created_by)
+        if user_id is None:
+            raise ValueError('created_by must be a user id')
+        query &= Q(**{f'{prefix}created_by_id': user_id})
+
+    split_method = params.get('split_method')
+    if split_method:
+        if split_method not in Expense.SplitMethodChoices.values:
+            raise ValueError(f'split_method must be one of {", ".join(Expense.SplitMethodChoices.values)}')
+        query &= Q(**{f'{prefix}split_method': split_method})
+
+    min_amount = params.get('min_amount')
+    if min_amount:
+        query &= Q(**{f'{prefix}total_amount_cents__gte': parse_amount(min_amount, 'min_amount', ROUND_CEILING)})
+
+    max_amount = params.get('max_amount')
+    if max_amount:
+        query &= Q(**{f'{prefix}total_amount_cents__lte': parse_amount(max_amount, 'max_amount', ROUND_FLOOR)})
+
+    return query
+
+
+class ExpenseFilterBackend(BaseFilterBackend):
+    """
+    Applies ``expense_filter`` to Expense querysets, or to ExpenseShare querysets
+    through their expense.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = '' if queryset.model is Expense else 'expense__'
+        try:
+            return queryset.filter(expense_filter(request.query_params, prefix=prefix))
+        except ValueError as e:
+            raise ParseError(str(e))
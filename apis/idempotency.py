@@ -0,0 +1,146 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+class ClaimLost(Exception):
+    """
+    Another request took the key over while this one was still running.
+    """
+
+
+def request_fingerprint(request):
+    payload = json.dumps([request.method, request.path, request.data], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Return ``(record, claimed)`` for ``user``'s ``key``.
+
+    ``claimed`` is True when the caller now holds the key and must run the
+    request. Otherwise ``record`` is the finished record to replay, a record
+    with another fingerprint, or the claim of a concurrent duplicate that did
+    not finish within ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds.
+
+    The claim is committed on its own, before the request runs, so the unique
+    constraint on ``(user, key)`` makes concurrent duplicates wait for it. A
+    claim older than the lock timeout belongs to a request that died and is taken over.
+    """
+    lock_timeout = timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    # Only a claim that was already stale when we arrived is taken over; a live one is waited for.
+    stale_before = timezone.now() - lock_timeout
+    deadline = time.monotonic() + lock_timeout.total_seconds()
+    while True:
+        now = timezone.now()
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is not None and record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+            record = None
+
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=user, key=key, fingerprint=fingerprint, locked_at=now,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+                return record, True
+            except IntegrityError:
+                continue
+
+        if record.response_status is not None or record.fingerprint != fingerprint:
+            return record, False
+        if record.locked_at <= stale_before and IdempotencyKey.objects.filter(
+                pk=record.pk, locked_at=record.locked_at, response_status__isnull=True).update(locked_at=now):
+            record.locked_at = now
+            return record, True
+        if time.monotonic() >= deadline:
+            return record, False
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent_response(request, key, handler):
+    """
+    Run ``handler(request)`` at most once per user and ``Idempotency-Key``.
+
+    The response is stored in the same transaction as the handler's writes, so a
+    retry either replays it without running the handler again or, if the first
+    attempt failed with an exception or a server error, runs it afresh.
+
+    The claim's ``locked_at`` identifies its holder. If the request ran so long
+    that a duplicate took the key over, storing the response matches no row and
+    the handler's writes are rolled back, so only one of the two takes effect.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response({'error': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    fingerprint = request_fingerprint(request)
+    record, claimed = claim_key(request.user, key, fingerprint)
+    if not claimed:
+        return stored_response(record, fingerprint)
+
+    try:
+        with transaction.atomic():
+            response = handler(request)
+            if response.status_code < 500 and not IdempotencyKey.objects.filter(
+                    pk=record.pk, locked_at=record.locked_at, response_status__isnull=True).update(
+                    response_status=response.status_code, response_body=response.data, locked_at=None):
+                raise ClaimLost()
+    except ClaimLost:
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return in_progress_response()
+        return stored_response(record, fingerprint)
+    except BaseException:
+        release_key(record)
+        raise
+    if response.status_code >= 500:
+        release_key(record)
+    return response
+
+
+def in_progress_response():
+    return Response({'error': 'A request with this Idempotency-Key is still in progress'},
+                    status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+
+
+def stored_response(record, fingerprint):
+    """
+    Answer a request whose key is held or was used by another request.
+    """
+    if record.fingerprint != fingerprint:
+        return Response({'error': 'Idempotency-Key was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.response_status is None:
+        return in_progress_response()
+    return Response(record.response_body, status=record.response_status, headers={'Idempotent-Replayed': 'true'})
+
+
+def release_key(record):
+    """
+    Drop the claim, unless another request has taken it over or finished it.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at, response_status__isnull=True).delete()
+
+
+def purge_expired_idempotency_keys():
+    """
+    Delete stored responses and abandoned claims whose TTL has passed.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,211 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from .balances import apply_deltas, expense_deltas
+from .models import Expense, ExpenseShare
+from .money import to_cents
+from .response_cache import bump_data_versions
+from .splits import build_shares, existing_user_ids
+
+CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+class RowError(Exception):
+    pass
+
+
+def iter_lines(stream):
+    """
+    Yield decoded text lines from a binary request stream without reading it all into memory.
+    """
+    if stream is None:
+        return
+    first = True
+    for raw in iter(stream.readline, b''):
+        line = raw.decode('utf-8', errors='replace')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+def read_ndjson(lines):
+    """
+    Yield ``(row_number, payload)`` pairs, where payload is a RowError for lines that can't be parsed.
+    """
+    for row_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError as e:
+            yield row_number, RowError(f'Invalid JSON: {e}')
+            continue
+        if not isinstance(payload, dict):
+            yield row_number, RowError('Each line must be a JSON object')
+            continue
+        yield row_number, payload
+
+
+def read_csv(lines):
+    """
+    Yield ``(row_number, payload)`` pairs from CSV rows with one share per row.
+
+    Consecutive rows sharing the same ``ref`` are folded into a single expense,
+    and the expense columns are read from the first row of the group.
+    """
+    reader = csv.DictReader(lines)
+    missing = [column for column in ('ref', 'description', 'total_amount', 'user_id') if
+               column not in (reader.fieldnames or [])]
+    if missing:
+        yield 1, RowError(f"Missing CSV columns: {', '.join(missing)}")
+        return
+
+    current_ref, payload, first_row = None, None, None
+    for row in reader:
+        row_number = reader.line_num
+        if payload is not None and row['ref'] == current_ref:
+            payload['shares'].append(_csv_share(row))
+            continue
+        if payload is not None:
+            yield first_row, payload
+        current_ref, first_row = row['ref'], row_number
+        payload = {
+            'ref': row['ref'],
+            'description': row['description'],
+            'total_amount': row['total_amount'],
+            'split_method': row.get('split_method') or Expense.SplitMethodChoices.EQUAL,
+            'shares': [_csv_share(row)],
+        }
+    if payload is not None:
+        yield first_row, payload
+
+
+def _csv_share(row):
+    share = {'user_id': row['user_id']}
+    if row.get('amount'):
+        share['amount'] = row['amount']
+    if row.get('percentage'):
+        share['percentage'] = row['percentage']
+    return share
+
+
+def rows_from_stream(stream, content_type):
+    """
+    Return the row iterator for a request body, or None if the content type is not supported.
+    """
+    fmt = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+    if fmt is None:
+        return None
+    reader = read_csv if fmt == 'csv' else read_ndjson
+    return reader(iter_lines(stream))
+
+
+def validate_row(payload):
+    """
+    Check the expense-level fields of an import row, mirroring ExpenseCreateSerializer.
+
+    Returns ``(description, total_cents, split_method, shares)``.
+    """
+    description = payload.get('description')
+    if not isinstance(description, str) or not description.strip():
+        raise RowError('description is required')
+    if len(description) > 255:
+        raise RowError('description must be at most 255 characters')
+
+    try:
+        total_amount = Decimal(str(payload.get('total_amount')))
+    except (InvalidOperation, ValueError):
+        raise RowError('total_amount must be a number')
+    if not total_amount.is_finite() or total_amount < 0:
+        raise RowError('total_amount must be a positive number')
+    if total_amount != total_amount.quantize(Decimal('0.01')) or total_amount >= Decimal('1e8'):
+        raise RowError('total_amount must have at most 10 digits and 2 decimal places')
+
+    split_method = payload.get('split_method') or Expense.SplitMethodChoices.EQUAL
+    if split_method not in Expense.SplitMethodChoices.values:
+        raise RowError(f'Invalid split method: {split_method}')
+
+    shares = payload.get('shares')
+    if not isinstance(shares, list):
+        raise RowError('shares must be a list')
+
+    return payload['description'], to_cents(total_amount, 'total_amount'), split_method, shares
+
+
+def import_expenses(rows, created_by, chunk_size, max_errors):
+    """
+    Validate and insert expenses from an iterator of ``(row_number, payload)`` pairs.
+
+    Rows are consumed ``chunk_size`` at a time and every chunk is committed in its
+    own transaction, so only one chunk is ever held in memory. Invalid rows are
+    skipped and reported instead of aborting the import.
+    """
+    report = {'created': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+
+    def fail(row_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < max_errors:
+            report['errors'].append({'row': row_number, 'error': str(error)})
+        else:
+            report['errors_truncated'] = True
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        parsed = []
+        for row_number, payload in chunk:
+            if isinstance(payload, RowError):
+                fail(row_number, payload)
+                continue
+            try:
+                parsed.append((row_number, validate_row(payload)))
+            except RowError as e:
+                fail(row_number, e)
+
+        known_user_ids = existing_user_ids(
+            share.get('user_id')
+            for _, (_, _, _, shares) in parsed
+            for share in shares if isinstance(share, dict)
+        )
+
+        expenses, expense_shares = [], []
+        for row_number, (description, total_cents, split_method, shares) in parsed:
+            try:
+                built = build_shares(total_cents, split_method, shares, known_user_ids)
+            except ValueError as e:
+                fail(row_number, e)
+                continue
+            expenses.append(Expense(
+                description=description,
+                total_amount_cents=total_cents,
+                created_by=created_by,
+                split_method=split_method
+            ))
+            expense_shares.append(built)
+
+        if not expenses:
+            continue
+        with transaction.atomic():
+            Expense.objects.bulk_create(expenses)
+            for expense, shares in zip(expenses, expense_shares):
+                for share in shares:
+                    share.expense = expense
+            ExpenseShare.objects.bulk_create([share for shares in expense_shares for share in shares])
+            deltas = expense_deltas(zip(expenses, expense_shares))
+            apply_deltas(deltas)
+            bump_data_versions(deltas)
+        report['created'] += len(expenses)
+
+    return report
@@ -0,0 +1,217 @@
+import json
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apis.balances import rebuild_balances
+from apis.models import Expense, ExpenseShare
+from apis.money import cents_to_decimal, split_evenly
+from apis.response_cache import response_cache
+from apis.splits import build_shares
+
+User = get_user_model()
+
+PASSWORD = 'bench-password'
+ENDPOINTS = ['create', 'list', 'my_expenses', 'total_expenses', 'balance_sheet', 'my_balance_sheet', 'token_obtain']
+CACHE_MODES = ['cold', 'warm']
+
+
+def seed(users, expenses, shares_per_expense, rng):
+    """
+    Fill the scratch database with synthetic users, expenses and shares using bulk inserts.
+    """
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(email=f'bench{i}@example.com', name=f'bench{i}', mobile_number=f'9{i:09d}', password=password)
+        for i in range(users)
+    ], batch_size=1000)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    known_user_ids = set(user_ids)
+
+    methods = list(Expense.SplitMethodChoices.values)
+    for start in range(0, expenses, 1000):
+        batch, batch_shares = [], []
+        for i in range(start, min(start + 1000, expenses)):
+            split_method = methods[i % len(methods)]
+            total_cents = rng.randint(100, 1000000)
+            participants = rng.sample(user_ids, min(shares_per_expense, len(user_ids)))
+            batch.append(Expense(description=f'Bench expense {i}', total_amount_cents=total_cents,
+                                 created_by_id=rng.choice(user_ids), split_method=split_method))
+            batch_shares.append(build_shares(total_cents, split_method,
+                                             share_payload(total_cents, split_method, participants),
+                                             known_user_ids))
+        with transaction.atomic():
+            Expense.objects.bulk_create(batch)
+            for expense, shares in zip(batch, batch_shares):
+                for share in shares:
+                    share.expense = expense
+            ExpenseShare.objects.bulk_create([share for shares in batch_shares for share in shares])
+    rebuild_balances()
+    return user_ids
+
+
+def share_payload(total_cents, split_method, participants):
+    if split_method == Expense.SplitMethodChoices.EXACT:
+        return [{'user_id': user_id, 'amount': cents_to_decimal(amount)}
+                for user_id, amount in zip(participants, split_evenly(total_cents, len(participants)))]
+    if split_method == Expense.SplitMethodChoices.PERCENTAGE:
+        percentages = [100 // len(participants)] * len(participants)
+        percentages[0] += 100 - sum(percentages)
+        return [{'user_id': user_id, 'percentage': percentage}
+                for user_id, percentage in zip(participants, percentages)]
+    return [{'user_id': user_id} for user_id in participants]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(sample['latency'] for sample in samples)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample['status'] >= 400),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'queries_per_request': round(statistics.mean(sample['queries'] for sample in samples), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Seed a scratch database with synthetic data, drive the expense API with the test client '
+            'and report latency percentiles, queries per request and peak RSS as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--expenses', type=int, default=2000)
+        parser.add_argument('--shares-per-expense', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requests per endpoint and concurrency level.')
+        parser.add_argument('--concurrency', default='1,4',
+                            help='Comma separated list of concurrent client counts.')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help=f"Comma separated subset of: {', '.join(ENDPOINTS)}")
+        parser.add_argument('--cache', choices=CACHE_MODES + ['both'], default='both',
+                            help='cold disables the response cache so every request runs its queries; warm '
+                                 'starts from an empty cache and lets repeated requests hit it.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        endpoints = [name for name in options['endpoints'].split(',') if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',') if level]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma separated list of integers')
+        if options['users'] < 1 or any(level < 1 for level in levels):
+            raise CommandError('--users and --concurrency must be positive')
+
+        rng = random.Random(options['seed'])
+        with tempfile.TemporaryDirectory() as workdir:
+            # A file-backed scratch database, so concurrent clients get their own connections.
+            connection.settings_dict['TEST']['NAME'] = str(Path(workdir) / 'bench.sqlite3')
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                started = time.perf_counter()
+                user_ids = seed(options['users'], options['expenses'], options['shares_per_expense'], rng)
+                seed_seconds = time.perf_counter() - started
+                modes = CACHE_MODES if options['cache'] == 'both' else [options['cache']]
+                results = {
+                    mode: {
+                        name: {str(level): self.drive(name, level, options['requests'], user_ids, rng, mode)
+                               for level in levels}
+                        for name in endpoints
+                    }
+                    for mode in modes
+                }
+            finally:
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report = {
+            'config': {key: options[key] for key in ('users', 'expenses', 'shares_per_expense', 'requests', 'seed')},
+            'concurrency': levels,
+            'seed_seconds': round(seed_seconds, 3),
+            'peak_rss_mb': round(peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+            # Per cache mode: cold numbers measure the queries, warm ones what clients see with the cache.
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def drive(self, endpoint, concurrency, requests, user_ids, rng, mode):
+        if mode == 'cold':
+            # A dummy cache never stores anything, so cached endpoints miss every time.
+            with override_settings(
+                    CACHES={**settings.CACHES, 'bench-disabled': {
+                        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                    EXPENSE_RESPONSE_CACHE='bench-disabled'):
+                return self.run_requests(endpoint, concurrency, requests, user_ids, rng)
+        response_cache().clear()
+        return self.run_requests(endpoint, concurrency, requests, user_ids, rng)
+
+    def run_requests(self, endpoint, concurrency, requests, user_ids, rng):
+        # Draw every random choice up front so worker threads never share the generator.
+        plan = [(rng.randrange(len(user_ids)), rng.sample(user_ids, min(3, len(user_ids))))
+                for _ in range(requests)]
+
+        def run(index):
+            user_index, participants = plan[index]
+            client = APIClient(raise_request_exception=False)
+            if endpoint != 'token_obtain':
+                token = AccessToken.for_user(User(pk=user_ids[user_index]))
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            try:
+                with CaptureQueriesContext(connections['default']) as queries:
+                    started = time.perf_counter()
+                    response = self.request(client, endpoint, user_index, participants)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    latency = time.perf_counter() - started
+                return {'latency': latency, 'status': response.status_code, 'queries': len(queries)}
+            finally:
+                connections['default'].close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(run, range(requests)))
+        return summarize(samples, time.perf_counter() - started)
+
+    def request(self, client, endpoint, user_index, participants):
+        if endpoint == 'create':
+            return client.post('/api/expenses/', {
+                'description': 'Bench create',
+                'total_amount': '120.00',
+                'split_method': 'EQUAL',
+                'shares': [{'user_id': str(user_id)} for user_id in participants],
+            }, format='json')
+        if endpoint == 'token_obtain':
+            return client.post('/account/token/obtain/', {
+                'email': f'bench{user_index}@example.com', 'password': PASSWORD,
+            })
+        if endpoint == 'list':
+            return client.get('/api/expenses/')
+        return client.get(f'/api/expenses/{endpoint}/')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apis.filters import expense_filter
+from apis.statements import STATEMENT_FORMATS, generate_statements
+
+
+class Command(BaseCommand):
+    help = 'Write one expense statement per user into a zip archive, building them on a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Zip file to write (default: statements-<YYYY-MM>.zip).')
+        parser.add_argument('--format', choices=STATEMENT_FORMATS, default='xlsx')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU; 0 builds the statements in this process).')
+        parser.add_argument('--batch-size', type=int, default=200, help='Users per worker task.')
+        parser.add_argument('--created-after', help='Only include expenses created on or after this ISO date.')
+        parser.add_argument('--created-before', help='Only include expenses created on or before this ISO date.')
+
+    def handle(self, *args, **options):
+        filters = {name: options[name] for name in ('created_after', 'created_before') if options[name]}
+        try:
+            expense_filter(filters)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        output = options['output'] or f'statements-{timezone.localdate():%Y-%m}.zip'
+        report = generate_statements(output, options['format'], options['workers'], options['batch_size'], filters)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {report['statements']} statement(s) ({report['rows']} rows) to {output} with "
+            f"{report['workers']} worker(s) in {report['seconds']:.2f}s: "
+            f"{report['statements_per_second']:.1f} statements/s."
+        ))
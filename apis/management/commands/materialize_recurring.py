@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apis.recurring import materialize_recurring
+
+
+class Command(BaseCommand):
+    help = 'Create the expenses of every recurring expense period that is due, catching up on missed periods.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help='Materialize periods up to this ISO date (default: today).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Templates read, and expenses written, per transaction.')
+
+    def handle(self, *args, **options):
+        until = timezone.localdate()
+        if options['until']:
+            try:
+                until = parse_date(options['until'])
+            except ValueError:
+                until = None
+            if until is None:
+                raise CommandError('--until must be an ISO 8601 date')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        report = materialize_recurring(until, options['batch_size'])
+        for error in report['errors']:
+            self.stdout.write(f"Recurring expense {error['recurring_expense']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f"Created {report['created']} expense(s) due up to {until}."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apis.export_jobs import fail_stale_exports, purge_expired_exports
+
+
+class Command(BaseCommand):
+    help = ('Fail export jobs that no worker will finish and delete expired exports with their files. '
+            'Run it periodically, e.g. from cron.')
+
+    def handle(self, *args, **options):
+        failed = fail_stale_exports()
+        purged = purge_expired_exports()
+        self.stdout.write(self.style.SUCCESS(f'Failed {failed} stale and deleted {purged} expired export(s).'))
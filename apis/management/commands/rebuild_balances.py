@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.balances import find_drift, rebuild_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the UserBalance ledger from the expense tables, or report drift with --check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the stored balances with the expense tables.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_drift()
+            for user_id, stored, expected in drift:
+                self.stdout.write(f'{user_id}: stored paid/owed/net {stored}, expected {expected}')
+            if drift:
+                raise CommandError(f'{len(drift)} balance(s) have drifted; run without --check to rebuild.')
+            self.stdout.write(self.style.SUCCESS('All balances match the expense tables.'))
+            return
+
+        count = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} balance(s).'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_balances(apps, schema_editor):
+    """
+    Build the ledger from the existing expenses, as apis.balances.rebuild_balances does, so existing databases
+    start with correct balances.
+    """
+    Expense = apps.get_model('apis', 'Expense')
+    ExpenseShare = apps.get_model('apis', 'ExpenseShare')
+    UserBalance = apps.get_model('apis', 'UserBalance')
+
+    totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for user_id, total in Expense.objects.values_list('created_by').annotate(total=Sum('total_amount')).order_by():
+        totals[user_id][0] = total or Decimal(0)
+    for user_id, total in ExpenseShare.objects.values_list('user').annotate(total=Sum('amount')).order_by():
+        totals[user_id][1] = total or Decimal(0)
+    UserBalance.objects.bulk_create([
+        UserBalance(user_id=user_id, total_paid=paid, total_owed=owed, net=paid - owed)
+        for user_id, (paid, owed) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0002_initial'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_owed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
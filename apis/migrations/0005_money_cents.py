@@ -0,0 +1,145 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:20
+
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def cents(field):
+    return Cast(Round(Coalesce(F(field), Value(Decimal(0))) * 100), BigIntegerField())
+
+
+def decimals_to_cents(apps, schema_editor):
+    Expense = apps.get_model('apis', 'Expense')
+    ExpenseShare = apps.get_model('apis', 'ExpenseShare')
+    UserBalance = apps.get_model('apis', 'UserBalance')
+    Expense.objects.update(total_amount_cents=cents('total_amount'))
+    ExpenseShare.objects.update(amount_cents=cents('amount'))
+    UserBalance.objects.update(
+        total_paid_cents=cents('total_paid'), total_owed_cents=cents('total_owed'), net_cents=cents('net'),
+    )
+
+
+def resplit_legacy_shares(apps, schema_editor):
+    """
+    Re-split the equal and percentage expenses whose shares, rounded one by one,
+    no longer add up to the total, as the API splits them now, and move the
+    cents that changed hands into the owers' balances.
+
+    Exact shares were entered in cents already and convert without loss.
+    """
+    from apis.money import split_by_percentages, split_evenly
+
+    Expense = apps.get_model('apis', 'Expense')
+    ExpenseShare = apps.get_model('apis', 'ExpenseShare')
+    UserBalance = apps.get_model('apis', 'UserBalance')
+
+    expenses = Expense.objects.filter(split_method__in=['EQUAL', 'PERCENTAGE']).annotate(
+        share_total=Sum('shares__amount_cents'),
+    ).exclude(share_total=F('total_amount_cents')).values_list('pk', 'split_method', 'total_amount_cents')
+    deltas = {}
+    for expense_id, split_method, total_cents in list(expenses):
+        shares = list(ExpenseShare.objects.filter(expense_id=expense_id).order_by('pk'))
+        if not shares:
+            continue
+        if split_method == 'PERCENTAGE':
+            if any(share.percentage is None for share in shares) or sum(share.percentage for share in shares) != 100:
+                continue
+            parts = split_by_percentages(total_cents, [share.percentage for share in shares])
+        else:
+            parts = split_evenly(total_cents, len(shares))
+        for share, cents in zip(shares, parts):
+            deltas[share.user_id] = deltas.get(share.user_id, 0) + cents - share.amount_cents
+            share.amount_cents = cents
+        ExpenseShare.objects.bulk_update(shares, ['amount_cents'])
+
+    for user_id, delta in deltas.items():
+        if delta:
+            UserBalance.objects.filter(user_id=user_id).update(
+                total_owed_cents=F('total_owed_cents') + delta, net_cents=F('net_cents') - delta,
+            )
+
+
+def cents_to_decimals(apps, schema_editor):
+    from apis.money import cents_to_decimal
+
+    for model_name, fields in (
+        ('Expense', {'total_amount': 'total_amount_cents'}),
+        ('ExpenseShare', {'amount': 'amount_cents'}),
+        ('UserBalance', {'total_paid': 'total_paid_cents', 'total_owed': 'total_owed_cents', 'net': 'net_cents'}),
+    ):
+        model = apps.get_model('apis', model_name)
+        rows = list(model.objects.only(*fields.values()))
+        for row in rows:
+            for decimal_field, cents_field in fields.items():
+                setattr(row, decimal_field, cents_to_decimal(getattr(row, cents_field)))
+        model.objects.bulk_update(rows, list(fields), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0004_expense_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='total_amount_cents',
+            field=models.BigIntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='expenseshare',
+            name='amount_cents',
+            field=models.BigIntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='userbalance',
+            name='total_paid_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userbalance',
+            name='total_owed_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userbalance',
+            name='net_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        # Nullable first, so that unapplying the RemoveField below can re-add the column before it is refilled.
+        migrations.AlterField(
+            model_name='expense',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True,
+                                      validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.RunPython(decimals_to_cents, cents_to_decimals),
+        migrations.RunPython(resplit_legacy_shares, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='expense',
+            name='total_amount',
+        ),
+        migrations.RemoveField(
+            model_name='expenseshare',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='userbalance',
+            name='total_paid',
+        ),
+        migrations.RemoveField(
+            model_name='userbalance',
+            name='total_owed',
+        ),
+        migrations.RemoveField(
+            model_name='userbalance',
+            name='net',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='kind',
+            field=models.CharField(choices=[('balance_sheet', 'Balance Sheet'), ('my_balance_sheet', 'My Expense Sheet'), ('statements', 'Statements')], max_length=20),
+        ),
+    ]
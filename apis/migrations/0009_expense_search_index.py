@@ -0,0 +1,63 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# An external-content FTS5 table: it stores only the index and reads descriptions from apis_expense. Triggers
+# rather than signals keep it in sync, so bulk_create, queryset updates and raw SQL are covered as well.
+CREATE_SEARCH_INDEX = [
+    """
+    CREATE VIRTUAL TABLE apis_expense_fts USING fts5(
+        description, content='apis_expense', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER apis_expense_fts_insert AFTER INSERT ON apis_expense BEGIN
+        INSERT INTO apis_expense_fts (rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER apis_expense_fts_delete AFTER DELETE ON apis_expense BEGIN
+        INSERT INTO apis_expense_fts (apis_expense_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER apis_expense_fts_update AFTER UPDATE OF description ON apis_expense BEGIN
+        INSERT INTO apis_expense_fts (apis_expense_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO apis_expense_fts (rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    "INSERT INTO apis_expense_fts (apis_expense_fts) VALUES ('rebuild')",
+]
+
+# Later migrations that rebuild apis_expense drop the triggers with the old table, so unapplying must tolerate them
+# being gone already.
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER IF EXISTS apis_expense_fts_update',
+    'DROP TRIGGER IF EXISTS apis_expense_fts_delete',
+    'DROP TRIGGER IF EXISTS apis_expense_fts_insert',
+    'DROP TABLE IF EXISTS apis_expense_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0008_exportjob_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseSearchIndex',
+            fields=[
+                ('expense', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='apis.expense')),
+                ('description', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'apis_expense_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+from apis.search import ensure_search_triggers
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    Altering the column rebuilds apis_expense on SQLite, which drops the search index triggers with the old table;
+    recreate them so the index stays in sync in either direction.
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        ensure_search_triggers(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        # Listed first so that it runs last when the migration is unapplied.
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AlterField(
+            model_name='expense',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
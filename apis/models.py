@@ -1,7 +1,13 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .money import cents_to_decimal
 
 User = get_user_model()
 
@@ -13,22 +19,58 @@ class Expense(models.Model):
         PERCENTAGE = 'PERCENTAGE', "Percentage"
 
     description = models.CharField(max_length=255)
-    total_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[
+    # Money is stored as integer cents; see apis.money.
+    total_amount_cents = models.BigIntegerField(validators=[
         MinValueValidator(0),
     ])
     created_by = models.ForeignKey(User, related_name='expenses_created', on_delete=models.CASCADE)
     split_method = models.CharField(max_length=20, choices=SplitMethodChoices.choices, default=SplitMethodChoices.EQUAL)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on the occurrences generated by ``manage.py materialize_recurring``.
+    recurring = models.ForeignKey('RecurringExpense', related_name='occurrences', null=True, blank=True,
+                                  on_delete=models.SET_NULL)
+    occurrence_date = models.DateField(null=True, blank=True)
+    # A default rather than auto_now_add, so materialized recurring expenses can be dated to their occurrence.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One occurrence per template and period, whatever happens to the template's schedule.
+            models.UniqueConstraint(fields=['recurring', 'occurrence_date'], name='expense_recurring_occurrence_uniq'),
+        ]
+        indexes = [
+            # Keyset pagination and date-range filters.
+            models.Index(fields=['created_at', 'id'], name='expense_created_id_idx'),
+            # Creator filters, ordered by date.
+            models.Index(fields=['created_by', 'created_at'], name='expense_creator_created_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.description} - {self.total_amount} - {self.created_by}"
+        return f"{self.description} - {cents_to_decimal(self.total_amount_cents)} - {self.created_by}"
+
+
+
+class ExpenseSearchIndex(models.Model):
+    """
+    The ``apis_expense_fts`` FTS5 table over Expense.description (see migration
+    0009), which triggers keep in sync with every write to apis_expense.
+
+    Read-only: ``rank`` is the bm25 score of the current MATCH, lower is better.
+    """
+    expense = models.OneToOneField(Expense, primary_key=True, db_column='rowid', related_name='search_index',
+                                   on_delete=models.DO_NOTHING)
+    description = models.TextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'apis_expense_fts'
 
 
 class ExpenseShare(models.Model):
     expense = models.ForeignKey(Expense, related_name='shares', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='expense_shares', on_delete=models.CASCADE)
-    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, validators=[
+    amount_cents = models.BigIntegerField(validators=[
         MinValueValidator(0),
     ])
     percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, validators=[
@@ -36,5 +78,141 @@ class ExpenseShare(models.Model):
         MaxValueValidator(100)
     ])
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expense'], name='share_user_expense_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} owes {cents_to_decimal(self.amount_cents)} for {self.expense}"
+
+
+class UserBalance(models.Model):
+    """
+    Running totals for a user, kept in step with Expense and ExpenseShare writes
+    so a balance lookup is a single primary-key read.
+    """
+    user = models.OneToOneField(User, primary_key=True, related_name='balance', on_delete=models.CASCADE)
+    total_paid_cents = models.BigIntegerField(default=0)
+    total_owed_cents = models.BigIntegerField(default=0)
+    net_cents = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} net {cents_to_decimal(self.net_cents)}"
+
+
+class RecurringExpense(models.Model):
+    """
+    Template for an expense that repeats on a schedule, e.g. rent or a subscription.
+
+    ``next_occurrence`` is the first period that has not been materialized yet;
+    ``manage.py materialize_recurring`` creates an Expense for every period up to
+    today and moves it forward.
+    """
+    class IntervalChoices(models.TextChoices):
+        DAILY = 'DAILY', "Daily"
+        WEEKLY = 'WEEKLY', "Weekly"
+        MONTHLY = 'MONTHLY', "Monthly"
+
+    description = models.CharField(max_length=255)
+    total_amount_cents = models.BigIntegerField(validators=[
+        MinValueValidator(0),
+    ])
+    created_by = models.ForeignKey(User, related_name='recurring_expenses', on_delete=models.CASCADE)
+    split_method = models.CharField(max_length=20, choices=Expense.SplitMethodChoices.choices,
+                                    default=Expense.SplitMethodChoices.EQUAL)
+    # Share payloads in the shape accepted by POST /api/expenses/.
+    shares = models.JSONField()
+    interval = models.CharField(max_length=10, choices=IntervalChoices.choices, default=IntervalChoices.MONTHLY)
+    starts_on = models.DateField()
+    ends_on = models.DateField(null=True, blank=True)
+    next_occurrence = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_occurrence'], name='recurring_next_occurrence_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.description} - {cents_to_decimal(self.total_amount_cents)} {self.interval.lower()}"
+
+
+class ExportJob(models.Model):
+    """
+    A balance sheet export built in the background by ``apis.export_jobs``.
+
+    ``fingerprint`` identifies the export and the data it was built from, so a
+    repeated request for unchanged data is answered with the existing job.
+    """
+    class KindChoices(models.TextChoices):
+        BALANCE_SHEET = 'balance_sheet', "Balance Sheet"
+        MY_BALANCE_SHEET = 'my_balance_sheet', "My Expense Sheet"
+        # A zip of per-user statements (apis.statements), requested from the admin.
+        STATEMENTS = 'statements', "Statements"
+
+    class FormatChoices(models.TextChoices):
+        XLSX = 'xlsx', "XLSX"
+        CSV = 'csv', "CSV"
+        NDJSON = 'ndjson', "NDJSON"
+
+    class StatusChoices(models.TextChoices):
+        PENDING = 'PENDING', "Pending"
+        RUNNING = 'RUNNING', "Running"
+        DONE = 'DONE', "Done"
+        FAILED = 'FAILED', "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, related_name='export_jobs', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KindChoices.choices)
+    format = models.CharField(max_length=10, choices=FormatChoices.choices, default=FormatChoices.XLSX)
+    # Expense filter query parameters, see apis.filters.expense_filter, plus ``user_ids`` for statements.
+    filters = models.JSONField(default=dict)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING)
+    rows_written = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    file = models.FileField(upload_to='exports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['requested_by', 'fingerprint'], name='exportjob_fingerprint_idx'),
+            models.Index(fields=['expires_at'], name='exportjob_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}.{self.format} for {self.requested_by} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a request sent with an ``Idempotency-Key`` header, see ``apis.idempotency``.
+
+    A row without ``response_status`` is a claim held by the request that is still running.
+    """
+    user = models.ForeignKey(User, related_name='idempotency_keys', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body, so a key reused for a different request is rejected.
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotencykey_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotencykey_expires_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.user} owes {self.amount} for {self.expense}"
+        return f"{self.key} for {self.user}"
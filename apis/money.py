@@ -0,0 +1,48 @@
+from decimal import ROUND_FLOOR, ROUND_HALF_EVEN, Decimal, InvalidOperation
+
+
+def to_decimal(value, field):
+    try:
+        value = value if isinstance(value, Decimal) else Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f'Invalid {field}: {value}')
+    if not value.is_finite():
+        raise ValueError(f'Invalid {field}: {value}')
+    return value
+
+
+def to_cents(value, field, rounding=ROUND_HALF_EVEN):
+    """
+    Convert a decimal amount (a Decimal, number or numeric string) to integer cents.
+    """
+    return int(to_decimal(value, field).scaleb(2).quantize(Decimal(1), rounding=rounding))
+
+
+def cents_to_decimal(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def split_evenly(total_cents, count):
+    """
+    Split ``total_cents`` into ``count`` parts that differ by at most one cent and
+    sum exactly to the total; the first ``total_cents % count`` parts get the extra cent.
+    """
+    base, remainder = divmod(total_cents, count)
+    return [base + 1 if index < remainder else base for index in range(count)]
+
+
+def split_by_percentages(total_cents, percentages):
+    """
+    Split ``total_cents`` by ``percentages`` (which must add up to 100) with the
+    largest remainder method, so the parts sum exactly to the total.
+
+    Every part is first rounded down; the cents left over go one each to the
+    parts with the largest rounded-off fractions, earlier parts first on ties.
+    """
+    exact = [total_cents * Decimal(percentage) / 100 for percentage in percentages]
+    parts = [int(value.to_integral_value(rounding=ROUND_FLOOR)) for value in exact]
+    leftover = total_cents - sum(parts)
+    by_fraction = sorted(range(len(parts)), key=lambda index: (parts[index] - exact[index], index))
+    for index in by_fraction[:leftover]:
+        parts[index] += 1
+    return parts
@@ -0,0 +1,162 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from operator import attrgetter
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first cursor pagination on a ``(timestamp, id)`` pair.
+
+    The cursor holds the key of the last row of the previous page and the next
+    page is fetched with ``WHERE (ts, id) < (cursor_ts, cursor_id)``, so any
+    page costs the same as the first one instead of growing with an OFFSET.
+    """
+    timestamp_field = 'created_at'
+    id_field = 'id'
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, params):
+        try:
+            page_size = int(params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, timestamp, pk):
+        return urlsafe_b64encode(f'{timestamp.isoformat()}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            timestamp, pk = urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+            timestamp = parse_datetime(timestamp)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+    def page_queryset(self, queryset, params):
+        """
+        Return the queryset of the requested page plus one look-ahead row, and the page size.
+        """
+        page_size = self.get_page_size(params)
+        queryset = queryset.order_by(f'-{self.timestamp_field}', f'-{self.id_field}')
+
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            # The redundant ``ts <= cursor_ts`` gives SQLite a range to seek the index to; the OR alone is a scan.
+            queryset = queryset.filter(
+                Q(**{f'{self.timestamp_field}__lte': timestamp}),
+                Q(**{f'{self.timestamp_field}__lt': timestamp}) | Q(**{f'{self.id_field}__lt': pk}),
+            )
+        return queryset[:page_size + 1], page_size
+
+    def cut_page(self, rows, page_size):
+        page = rows[:page_size]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            last = page[-1]
+            key = attrgetter(self.timestamp_field.replace('__', '.'), self.id_field.replace('__', '.'))(last)
+            self.next_cursor = self.encode_cursor(*key)
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset, page_size = self.page_queryset(queryset, request.query_params)
+        return self.cut_page(list(queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async counterpart of ``paginate_queryset`` for plain Django requests.
+        """
+        self.request = request
+        queryset, page_size = self.page_queryset(queryset, request.GET)
+        return self.cut_page([row async for row in queryset.aiterator(chunk_size=page_size + 1)], page_size)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ExpenseShareKeysetPagination(KeysetPagination):
+    """
+    Newest-expense-first keyset pagination of one user's shares on ``(expense_id, id)``.
+
+    Sorting on the expense's ``created_at`` would need a sort over all of the
+    user's shares on every page; ``share_user_expense_idx`` (user, expense)
+    serves this order directly once the shares are filtered to one user.
+    """
+    timestamp_field = 'expense_id'
+
+    def encode_cursor(self, expense_id, pk):
+        return urlsafe_b64encode(f'{expense_id}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            expense_id, pk = urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+            return int(expense_id), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class SearchRankPagination(KeysetPagination):
+    """
+    Best-match-first keyset pagination of search results on ``(search_rank, id)``.
+
+    ``search_rank`` is the FTS5 bm25 score, where lower is better, so pages run
+    in ascending order and the cursor holds the exact score of the last row.
+    """
+    timestamp_field = 'search_rank'
+
+    def encode_cursor(self, rank, pk):
+        return urlsafe_b64encode(f'{rank!r}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            rank, pk = urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+            return float(rank), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def page_queryset(self, queryset, params):
+        page_size = self.get_page_size(params)
+        queryset = queryset.order_by('search_rank', 'id')
+
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            rank, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(search_rank__gt=rank) | Q(search_rank=rank, id__gt=pk))
+        return queryset[:page_size + 1], page_size
@@ -0,0 +1,140 @@
+import calendar
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .balances import apply_deltas, expense_deltas
+from .models import Expense, ExpenseShare, RecurringExpense
+from .response_cache import bump_data_versions
+from .splits import build_shares, existing_user_ids
+
+
+def add_months(day, months):
+    """
+    Move ``day`` by ``months`` months, clamping to the end of shorter months.
+    """
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def following_occurrence(template, day):
+    """
+    Return the period after ``day`` in ``template``'s schedule.
+
+    Monthly schedules stay anchored to the day of ``starts_on``, so a template
+    starting on the 31st runs on the last day of shorter months and on the 31st again afterwards.
+    """
+    if template.interval == RecurringExpense.IntervalChoices.DAILY:
+        return day + timedelta(days=1)
+    if template.interval == RecurringExpense.IntervalChoices.WEEKLY:
+        return day + timedelta(weeks=1)
+    start = template.starts_on
+    return add_months(start, (day.year - start.year) * 12 + day.month - start.month + 1)
+
+
+def due_occurrences(template, until):
+    """
+    Yield the dates of ``template``'s periods that are due up to ``until``, starting at ``next_occurrence``.
+    """
+    last = until if template.ends_on is None else min(until, template.ends_on)
+    day = template.next_occurrence
+    while day <= last:
+        yield day
+        day = following_occurrence(template, day)
+
+
+def materialize_recurring(until, batch_size=1000):
+    """
+    Create an Expense for every period of every recurring template that is due up to ``until``.
+
+    Templates are read ``batch_size`` at a time and occurrences are written in
+    transactions of up to ``batch_size`` expenses, each with a fixed number of
+    bulk queries however many periods a template has missed. Every transaction
+    also moves the templates' ``next_occurrence`` forward, and periods that
+    already have an expense are skipped, so running it again for the same
+    ``until`` creates nothing.
+
+    Templates whose shares no longer validate (e.g. a participant was deleted)
+    are left where they are and listed in the report's ``errors``.
+    """
+    report = {'created': 0, 'errors': []}
+    due = (RecurringExpense.objects.filter(next_occurrence__lte=until)
+           .filter(Q(ends_on__isnull=True) | Q(ends_on__gte=F('next_occurrence'))).order_by('pk'))
+    pending, last_pk = [], None
+    while True:
+        templates = list((due if last_pk is None else due.filter(pk__gt=last_pk))[:batch_size])
+        if not templates:
+            break
+        last_pk = templates[-1].pk
+
+        known_user_ids = existing_user_ids(
+            share.get('user_id')
+            for template in templates if isinstance(template.shares, list)
+            for share in template.shares if isinstance(share, dict)
+        )
+        for template in templates:
+            try:
+                shares = build_shares(template.total_amount_cents, template.split_method, template.shares,
+                                      known_user_ids)
+            except ValueError as e:
+                report['errors'].append({'recurring_expense': template.pk, 'error': str(e)})
+                continue
+            for day in due_occurrences(template, until):
+                pending.append((template, day, shares))
+                if len(pending) >= batch_size:
+                    report['created'] += _write_occurrences(pending)
+                    pending = []
+
+    if pending:
+        report['created'] += _write_occurrences(pending)
+    return report
+
+
+@transaction.atomic
+def _write_occurrences(pending):
+    """
+    Insert the ``(template, day, shares)`` occurrences that do not exist yet and
+    advance their templates past them. Returns the number of expenses created.
+    """
+    days = [day for _, day, _ in pending]
+    existing = set(Expense.objects.filter(
+        recurring__in={template.pk for template, _, _ in pending},
+        occurrence_date__range=(min(days), max(days)),
+    ).values_list('recurring_id', 'occurrence_date'))
+
+    templates, expenses, expense_shares = {}, [], []
+    for template, day, shares in pending:
+        template.next_occurrence = following_occurrence(template, day)
+        templates[template.pk] = template
+        if (template.pk, day) in existing:
+            continue
+        expenses.append(Expense(
+            description=template.description,
+            total_amount_cents=template.total_amount_cents,
+            created_by_id=template.created_by_id,
+            split_method=template.split_method,
+            recurring=template,
+            occurrence_date=day,
+            # Dated to the period it belongs to, so catching up does not bunch occurrences at today.
+            created_at=timezone.make_aware(datetime.combine(day, time.min)),
+        ))
+        expense_shares.append([
+            ExpenseShare(user_id=share.user_id, amount_cents=share.amount_cents, percentage=share.percentage)
+            for share in shares
+        ])
+
+    if expenses:
+        Expense.objects.bulk_create(expenses)
+        for expense, shares in zip(expenses, expense_shares):
+            for share in shares:
+                share.expense = expense
+        ExpenseShare.objects.bulk_create([share for shares in expense_shares for share in shares])
+        deltas = expense_deltas(zip(expenses, expense_shares))
+        apply_deltas(deltas)
+        bump_data_versions(deltas)
+    RecurringExpense.objects.bulk_update(templates.values(), ['next_occurrence'])
+    return len(expenses)
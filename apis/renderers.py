@@ -0,0 +1,48 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Lets DRF negotiate a download format (via ``?format=`` or the Accept header)
+    for views that build their own streaming response. Only payloads ever reach
+    ``render``; ``json_errors`` makes sure error payloads are labelled as JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode('utf-8')
+
+
+class XLSXRenderer(PassthroughRenderer):
+    media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    format = 'xlsx'
+
+
+class CSVRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(PassthroughRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+# JSON stays acceptable, so clients asking for application/json still get the (xlsx) download and JSON errors.
+EXPORT_RENDERERS = [XLSXRenderer, CSVRenderer, NDJSONRenderer, JSONRenderer]
+
+
+def json_errors(response):
+    """
+    Render an error ``Response`` negotiated for a download format as JSON instead.
+    """
+    if response.status_code >= 400 and isinstance(getattr(response, 'accepted_renderer', None), PassthroughRenderer):
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = JSONRenderer.media_type
+    return response
@@ -0,0 +1,137 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from daily_expense_sharing.routers import route_reads_to_replica
+
+GLOBAL_SCOPE = 'all'
+USER_SCOPE = 'user'
+
+VERSION_PREFIX = 'expense-version'
+RESPONSE_PREFIX = 'expense-response'
+
+
+def response_cache():
+    return caches[getattr(settings, 'EXPENSE_RESPONSE_CACHE', 'expense_responses')]
+
+
+def _version_key(owner):
+    return f'{VERSION_PREFIX}:{owner}'
+
+
+def data_versions(cache, user_id):
+    """
+    Return the current ``(user, global)`` data version tokens, creating any that are missing.
+
+    Versions are random tokens rather than counters, so a version that is evicted
+    and recreated can never match a response cached under an older version.
+    """
+    keys = [_version_key(user_id), _version_key(GLOBAL_SCOPE)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def bump_data_versions(user_ids):
+    """
+    Invalidate cached responses of every user in ``user_ids`` and of the global
+    listings, once the surrounding transaction has committed.
+    """
+    keys = [_version_key(user_id) for user_id in set(user_ids)] + [_version_key(GLOBAL_SCOPE)]
+
+    def bump():
+        response_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def _tee(content, store, max_bytes):
+    chunks, size = [], 0
+    for chunk in content:
+        if chunks is not None:
+            size += len(chunk)
+            if size > max_bytes:
+                chunks = None
+            else:
+                chunks.append(chunk)
+        yield chunk
+    if chunks is not None:
+        store(b''.join(chunks))
+
+
+def cached_response(scope):
+    """
+    Cache the successful GET responses of a viewset action per user and data version.
+
+    ``scope`` is ``USER_SCOPE`` when the response only depends on the requesting
+    user's expenses, or ``GLOBAL_SCOPE`` when any expense write can change it.
+    A hit is served straight from the cache without touching the database.
+
+    A miss always reads the primary. Versions are bumped as soon as the primary
+    commits, so a lagging replica would store stale data under the new version.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_method(self, request, *args, **kwargs)
+
+            cache = response_cache()
+            user_version, global_version = data_versions(cache, request.user.pk)
+            version = user_version if scope == USER_SCOPE else global_version
+            variant = hashlib.md5(
+                f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}".encode()
+            ).hexdigest()
+            key = f'{RESPONSE_PREFIX}:{view_method.__name__}:{request.user.pk}:{version}:{variant}'
+
+            cached = cache.get(key)
+            if cached is not None:
+                headers = dict(cached['headers'])
+                not_modified = get_conditional_response(
+                    request,
+                    etag=headers.get('ETag'),
+                    last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+                )
+                if not_modified is not None:
+                    return not_modified
+                response = HttpResponse(cached['content'], status=cached['status'])
+                for header, value in cached['headers']:
+                    response[header] = value
+                return response
+
+            route_reads_to_replica(False)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            timeout = getattr(settings, 'EXPENSE_RESPONSE_CACHE_TIMEOUT', 300)
+            max_bytes = getattr(settings, 'EXPENSE_RESPONSE_CACHE_MAX_BYTES', 1024 * 1024)
+
+            def store(content):
+                cache.set(key, {
+                    'status': response.status_code,
+                    'headers': list(response.items()),
+                    'content': content,
+                }, timeout=timeout)
+
+            if response.streaming:
+                response.streaming_content = _tee(response.streaming_content, store, max_bytes)
+            elif hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(
+                    lambda rendered: store(rendered.content) if len(rendered.content) <= max_bytes else None
+                )
+            elif len(response.content) <= max_bytes:
+                store(response.content)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,110 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Exists, F, FloatField, Lookup, OuterRef, Q, Value
+
+from .models import ExpenseSearchIndex, ExpenseShare
+
+MAX_SEARCH_TERMS = 16
+
+# Same triggers as migration 0009. SQLite drops them with the table whenever a migration rebuilds apis_expense,
+# so ``ensure_search_triggers`` recreates any that are missing after every migrate (see ApisConfig.ready).
+SEARCH_TRIGGERS = {
+    'apis_expense_fts_insert': """
+    CREATE TRIGGER IF NOT EXISTS apis_expense_fts_insert AFTER INSERT ON apis_expense BEGIN
+        INSERT INTO apis_expense_fts (rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    'apis_expense_fts_delete': """
+    CREATE TRIGGER IF NOT EXISTS apis_expense_fts_delete AFTER DELETE ON apis_expense BEGIN
+        INSERT INTO apis_expense_fts (apis_expense_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END
+    """,
+    'apis_expense_fts_update': """
+    CREATE TRIGGER IF NOT EXISTS apis_expense_fts_update AFTER UPDATE OF description ON apis_expense BEGIN
+        INSERT INTO apis_expense_fts (apis_expense_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO apis_expense_fts (rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+}
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+ExpenseSearchIndex._meta.get_field('description').register_lookup(Match)
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query that matches any of its words as a prefix.
+
+    Every word is quoted, so FTS5 operators in the input are searched for
+    literally; bm25 ranks descriptions that match more and rarer words first.
+    """
+    terms = re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]
+    return ' OR '.join(f'"{term}"*' for term in terms)
+
+
+def participating(queryset, user):
+    """
+    Limit an Expense queryset to the expenses ``user`` created or has a share in.
+    """
+    return queryset.filter(
+        Q(created_by=user) | Exists(ExpenseShare.objects.filter(expense=OuterRef('pk'), user=user))
+    )
+
+
+def search_expenses(queryset, text, user):
+    """
+    Full-text search ``user``'s expenses in ``queryset``, annotated with ``search_rank``.
+    """
+    query = fts_query(text)
+    if not query:
+        # Keep the annotation so the rank pagination can still order the (empty) result.
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return participating(queryset, user).filter(search_index__description__match=query).annotate(
+        search_rank=F('search_index__rank'),
+    )
+
+
+def ensure_search_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Recreate the sync triggers that are missing and return their names.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'apis_expense'")
+        missing = set(SEARCH_TRIGGERS) - {name for name, in cursor.fetchall()}
+        for name in sorted(missing):
+            cursor.execute(SEARCH_TRIGGERS[name])
+    return missing
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Recreate missing sync triggers, then rebuild and optimize the index from apis_expense.
+    """
+    table = ExpenseSearchIndex._meta.db_table
+    ensure_search_triggers(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return ExpenseSearchIndex.objects.using(using).count()
+
+
+def repair_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    ``post_migrate`` handler: when a migration dropped sync triggers, recreate
+    them and rebuild the index, which missed every write made without them.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or ExpenseSearchIndex._meta.db_table not in connection.introspection.table_names():
+        return
+    if ensure_search_triggers(using):
+        rebuild_search_index(using)
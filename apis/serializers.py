@@ -1,19 +1,90 @@
+from decimal import Decimal
+
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Expense, ExpenseShare
+from daily_expense_sharing.middleware import TimedSerializerMixin
+from .filters import FILTER_PARAMS, expense_filter
+from .models import Expense, ExpenseShare, ExportJob, RecurringExpense, UserBalance
+from .money import cents_to_decimal, to_cents
+from .splits import build_shares, existing_user_ids
 from users.serializers import UserSerializer
 
 
-class ExpenseShareSerializer(serializers.ModelSerializer):
+def parse_field_list(value):
+    """
+    Turn a comma separated query parameter into a set of names, or None when it was not given.
+    """
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class CentsField(serializers.DecimalField):
+    """
+    A decimal amount in the API, stored as integer cents on the model.
+    """
+
+    def __init__(self, max_digits=14, **kwargs):
+        super().__init__(max_digits=max_digits, decimal_places=2, **kwargs)
+
+    def to_internal_value(self, data):
+        return to_cents(super().to_internal_value(data), self.field_name)
+
+    def to_representation(self, value):
+        return super().to_representation(cents_to_decimal(value))
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients shape the representation through the serializer context.
+
+    ``fields`` limits the top-level fields that are returned. ``expand`` lists the
+    relations (dotted for nested serializers, e.g. ``shares.user``) that are
+    rendered as nested objects; relations in ``expandable_fields`` that are not
+    listed are rendered as their primary key. When ``expand`` is not given every
+    relation stays nested.
+    """
+    expandable_fields = ()
+
+    def _field_path(self):
+        names, node = [], self
+        while node is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        path = self._field_path()
+
+        requested = self.context.get('fields')
+        if requested is not None and not path:
+            fields = {name: field for name, field in fields.items() if name in requested}
+
+        expand = self.context.get('expand')
+        if expand is not None:
+            for name in self.expandable_fields:
+                if name in fields and (f'{path}.{name}' if path else name) not in expand:
+                    fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
+
+
+class ExpenseShareSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    amount = CentsField(source='amount_cents', read_only=True)
+    expandable_fields = ('user',)
 
     class Meta:
         model = ExpenseShare
         fields = ['id', 'user', 'amount', 'percentage']
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
+    total_amount = CentsField(source='total_amount_cents', max_digits=10, min_value=Decimal(0))
     shares = ExpenseShareSerializer(many=True, read_only=True)
+    expandable_fields = ('created_by',)
 
     class Meta:
         model = Expense
@@ -22,8 +93,88 @@ class ExpenseSerializer(serializers.ModelSerializer):
 
 
 class ExpenseCreateSerializer(serializers.ModelSerializer):
+    total_amount = CentsField(source='total_amount_cents', max_digits=10, min_value=Decimal(0))
     shares = serializers.ListField(write_only=True)
 
     class Meta:
         model = Expense
         fields = ['description', 'total_amount', 'split_method', 'shares']
+
+
+class UserBalanceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    total_paid = CentsField(source='total_paid_cents', read_only=True)
+    total_owed = CentsField(source='total_owed_cents', read_only=True)
+    net = CentsField(source='net_cents', read_only=True)
+
+    class Meta:
+        model = UserBalance
+        fields = ['total_paid', 'total_owed', 'net', 'updated_at']
+
+
+class RecurringExpenseSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    total_amount = CentsField(source='total_amount_cents', max_digits=10, min_value=Decimal(0))
+    shares = serializers.ListField(child=serializers.DictField())
+
+    class Meta:
+        model = RecurringExpense
+        fields = ['id', 'description', 'total_amount', 'split_method', 'shares', 'interval', 'starts_on', 'ends_on',
+                  'next_occurrence', 'created_at', 'updated_at']
+        read_only_fields = ['next_occurrence']
+
+    def validate(self, attrs):
+        def current(name):
+            return attrs[name] if name in attrs else getattr(self.instance, name, None)
+
+        shares = current('shares')
+        known_user_ids = existing_user_ids(share.get('user_id') for share in shares)
+        try:
+            build_shares(current('total_amount_cents'), current('split_method') or Expense.SplitMethodChoices.EQUAL,
+                         shares, known_user_ids)
+        except ValueError as e:
+            raise serializers.ValidationError({'shares': str(e)})
+        if current('ends_on') and current('ends_on') < current('starts_on'):
+            raise serializers.ValidationError({'ends_on': 'ends_on must not be before starts_on'})
+        if 'starts_on' in attrs:
+            attrs['next_occurrence'] = attrs['starts_on']
+        return attrs
+
+
+class ExportJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    filters = serializers.DictField(child=serializers.CharField(), required=False, default=dict)
+    progress = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'format', 'filters', 'status', 'rows_written', 'total_rows', 'progress',
+                  'download_url', 'error', 'created_at', 'finished_at', 'expires_at']
+        read_only_fields = ['status', 'rows_written', 'total_rows', 'error', 'finished_at', 'expires_at']
+
+    def validate_kind(self, value):
+        if value == ExportJob.KindChoices.STATEMENTS:
+            raise serializers.ValidationError('Statements are generated from the admin')
+        return value
+
+    def validate_filters(self, value):
+        unknown = sorted(set(value) - set(FILTER_PARAMS))
+        if unknown:
+            raise serializers.ValidationError(f'Unknown filters: {", ".join(unknown)}')
+        try:
+            expense_filter(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def get_progress(self, job):
+        if job.status == ExportJob.StatusChoices.DONE:
+            return 1.0
+        if not job.total_rows:
+            return 0.0
+        return round(job.rows_written / job.total_rows, 4)
+
+    def get_download_url(self, job):
+        if job.status != ExportJob.StatusChoices.DONE:
+            return None
+        url = reverse('export-job-download', args=[job.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
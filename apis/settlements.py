@@ -0,0 +1,36 @@
+import heapq
+
+
+def minimize_transfers(balances):
+    """
+    Suggest transfers that settle every balance, using a greedy min-cash-flow pass.
+
+    ``balances`` maps a user id to their net balance in integer cents: positive
+    when the user is owed money, negative when they owe it. The largest debtor
+    repeatedly pays the largest creditor, so every transfer settles at least
+    one of the two and at most ``n - 1`` transfers are produced in
+    O(n log n) time.
+
+    Returns a list of ``(debtor, creditor, cents)`` tuples.
+    """
+    creditors = [(-cents, user) for user, cents in balances.items() if cents > 0]
+    debtors = [(cents, user) for user, cents in balances.items() if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = creditors[0]
+        debt, debtor = debtors[0]
+        credit, debt = -credit, -debt
+        cents = min(credit, debt)
+        transfers.append((debtor, creditor, cents))
+        if credit > cents:
+            heapq.heapreplace(creditors, (cents - credit, creditor))
+        else:
+            heapq.heappop(creditors)
+        if debt > cents:
+            heapq.heapreplace(debtors, (cents - debt, debtor))
+        else:
+            heapq.heappop(debtors)
+    return transfers
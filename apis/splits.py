@@ -0,0 +1,97 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+
+from .models import Expense, ExpenseShare
+from .money import cents_to_decimal, split_by_percentages, split_evenly, to_cents, to_decimal
+
+User = get_user_model()
+
+
+def parse_user_id(value):
+    """
+    Return the UUID for a share's user_id, or None when it cannot be a user id.
+    """
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def existing_user_ids(user_ids):
+    """
+    Resolve a collection of user ids against the database with a single query.
+    """
+    parsed = {user_id for user_id in map(parse_user_id, user_ids) if user_id is not None}
+    if not parsed:
+        return set()
+    return set(User.objects.filter(id__in=parsed).values_list('id', flat=True))
+
+
+def missing_users_error(missing):
+    if len(missing) == 1:
+        return f'User with id {missing[0]} does not exist'
+    return f"Users with ids {', '.join(missing)} do not exist"
+
+
+def share_payloads(shares):
+    """
+    Turn saved shares back into the payloads ``build_shares`` accepts, to re-split an expense among the same users.
+    """
+    return [
+        {'user_id': share.user_id, 'amount': cents_to_decimal(share.amount_cents), 'percentage': share.percentage}
+        for share in shares
+    ]
+
+
+def build_shares(total_cents, split_method, shares, known_user_ids):
+    """
+    Apply the split rules to a list of share payloads and return unsaved
+    ExpenseShare instances (without an expense attached).
+
+    ``total_cents`` is the expense total in integer cents, and the share amounts
+    always add up to it exactly. ``known_user_ids`` is the set of user ids that
+    exist, as returned by ``existing_user_ids``. Raises ValueError when the
+    payload is invalid.
+    """
+    if not shares:
+        raise ValueError('At least one share is required')
+    if any(not isinstance(share, dict) or 'user_id' not in share for share in shares):
+        raise ValueError('Each share must include a user_id')
+
+    missing = []
+    for share in shares:
+        if parse_user_id(share['user_id']) not in known_user_ids and str(share['user_id']) not in missing:
+            missing.append(str(share['user_id']))
+    if missing:
+        raise ValueError(missing_users_error(missing))
+
+    split_method = split_method or Expense.SplitMethodChoices.EQUAL
+
+    if split_method == Expense.SplitMethodChoices.EQUAL:
+        return [
+            ExpenseShare(user_id=parse_user_id(share['user_id']), amount_cents=amount)
+            for share, amount in zip(shares, split_evenly(total_cents, len(shares)))
+        ]
+
+    if split_method == Expense.SplitMethodChoices.EXACT:
+        amounts = [to_cents(share.get('amount'), 'amount') for share in shares]
+        if sum(amounts) != total_cents:
+            raise ValueError(f'Total amount must equal {cents_to_decimal(total_cents)}')
+        return [
+            ExpenseShare(user_id=parse_user_id(share['user_id']), amount_cents=amount)
+            for share, amount in zip(shares, amounts)
+        ]
+
+    if split_method == Expense.SplitMethodChoices.PERCENTAGE:
+        percentages = [to_decimal(share.get('percentage'), 'percentage') for share in shares]
+        if sum(percentages) != 100:
+            raise ValueError('Total percentage must equal 100%')
+        return [
+            ExpenseShare(user_id=parse_user_id(share['user_id']), amount_cents=amount, percentage=percentage)
+            for share, percentage, amount in zip(shares, percentages, split_by_percentages(total_cents, percentages))
+        ]
+
+    raise ValueError(f'Invalid split method: {split_method}')
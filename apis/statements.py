@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections
+
+from .exports import MY_BALANCE_SHEET_FIELDS, MY_BALANCE_SHEET_HEADERS, export_stream, with_amounts
+from .filters import expense_filter
+from .models import ExpenseShare
+from .workers import setup_django_worker
+
+STATEMENT_FORMATS = ('xlsx', 'csv')
+
+
+def statement_user_ids(filters=None, user_ids=None):
+    """
+    Return the ids of the users with at least one share matching ``filters``, in a stable order.
+    """
+    shares = ExpenseShare.objects.filter(expense_filter(filters or {}, prefix='expense__'))
+    if user_ids is not None:
+        shares = shares.filter(user_id__in=user_ids)
+    return list(shares.order_by('user_id').values_list('user_id', flat=True).distinct())
+
+
+def write_statement_batch(user_ids, fmt, filters, directory):
+    """
+    Write one statement file per user of a batch into ``directory``.
+
+    The rows of the whole batch come from a single query ordered by user, read
+    in chunks, so a worker holds one user's statement at a time. Returns
+    ``(archive name, path, row count)`` for every file written.
+    """
+    rows = ExpenseShare.objects.filter(
+        expense_filter(filters or {}, prefix='expense__'), user_id__in=user_ids,
+    ).order_by('user_id', 'expense_id', 'id').values_list(
+        'user_id', 'user__email', 'expense__description', 'expense__total_amount_cents', 'expense__split_method',
+        'expense__created_by__email', 'amount_cents', 'percentage'
+    ).iterator(chunk_size=2000)
+
+    written = []
+    for (user_id, email), user_rows in groupby(rows, key=itemgetter(0, 1)):
+        counter = [0]
+
+        def statement_rows(user_rows=user_rows, counter=counter):
+            for row in with_amounts((row[2:] for row in user_rows), (1, 4)):
+                counter[0] += 1
+                yield row
+
+        path = os.path.join(directory, f'{user_id}.{fmt}')
+        with open(path, 'wb') as output:
+            for chunk in export_stream(fmt, "My Expense Sheet", MY_BALANCE_SHEET_HEADERS, MY_BALANCE_SHEET_FIELDS,
+                                       statement_rows()):
+                output.write(chunk)
+        written.append((f'{email}.{fmt}', path, counter[0]))
+    return written
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+
+
+def _pool_options():
+    """
+    Return the ``ProcessPoolExecutor`` keyword arguments for the statement workers.
+
+    A single-threaded process, such as a management command, forks its workers;
+    they inherit the configured project, including a scratch or test database.
+    Forking a multi-threaded process (the web server running an export job) can
+    leave locks held by other threads, such as logging's or SQLite's, locked in
+    the children for good. Such processes start fresh workers with
+    ``forkserver`` or ``spawn``, which set Django up again.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods and threading.active_count() == 1:
+        return {'mp_context': multiprocessing.get_context('fork'), 'initializer': _init_worker}
+    method = 'forkserver' if 'forkserver' in methods else 'spawn'
+    return {
+        'mp_context': multiprocessing.get_context(method),
+        'initializer': setup_django_worker,
+        'initargs': (settings.SETTINGS_MODULE, str(connections['default'].settings_dict['NAME'])),
+    }
+
+
+def generate_statements(archive, fmt='xlsx', workers=None, batch_size=200, filters=None, user_ids=None):
+    """
+    Write one statement per user into the zip file ``archive`` (a path or a binary file object).
+
+    Users are divided into batches of ``batch_size`` and the batches are spread
+    over a pool of ``workers`` processes (default: one per CPU; 0 builds them in
+    this process). Returns a report with the number of statements and rows and
+    the throughput in statements per second.
+    """
+    started = time.perf_counter()
+    users = statement_user_ids(filters, user_ids)
+    batches = [users[start:start + batch_size] for start in range(0, len(users), batch_size)]
+    workers = os.cpu_count() if workers is None else workers
+    # Statements are already deflated XLSX archives; only the CSV files are worth compressing.
+    compression = zipfile.ZIP_STORED if fmt == 'xlsx' else zipfile.ZIP_DEFLATED
+
+    statements = rows = 0
+    with tempfile.TemporaryDirectory() as directory, \
+            zipfile.ZipFile(archive, 'w', compression=compression, compresslevel=1) as zip_file:
+        def collect(written):
+            nonlocal statements, rows
+            for name, path, count in written:
+                zip_file.write(path, name)
+                os.remove(path)
+                statements += 1
+                rows += count
+
+        if not workers:
+            for batch in batches:
+                collect(write_statement_batch(batch, fmt, filters, directory))
+        else:
+            options = _pool_options()
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, **options) as pool:
+                futures = [pool.submit(write_statement_batch, batch, fmt, filters, directory) for batch in batches]
+                for future in as_completed(futures):
+                    collect(future.result())
+
+    elapsed = time.perf_counter() - started
+    return {
+        'statements': statements,
+        'rows': rows,
+        'workers': workers,
+        'seconds': elapsed,
+        'statements_per_second': statements / elapsed if elapsed else 0.0,
+    }
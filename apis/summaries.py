@@ -0,0 +1,71 @@
+from django.db.models import Case, Count, DateField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .money import cents_to_decimal
+
+PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+SHARE_GROUPS = ('day', 'week', 'month', 'creator', 'split_method', 'counterparty')
+EXPENSE_GROUPS = ('day', 'week', 'month', 'creator', 'split_method')
+
+
+def _group_key(group_by, prefix):
+    """
+    Return the output name and the expression an aggregate query is grouped by.
+    """
+    if group_by in PERIODS:
+        return 'period', PERIODS[group_by](f'{prefix}created_at', output_field=DateField())
+    if group_by == 'creator':
+        return 'created_by', F(f'{prefix}created_by')
+    return 'split_method', F(f'{prefix}split_method')
+
+
+def _amount(cents):
+    return str(cents_to_decimal(cents or 0))
+
+
+def share_summary(shares, user, group_by):
+    """
+    Total the amounts ``user`` owes on ``shares``, grouped by ``group_by`` (one
+    of ``SHARE_GROUPS``), with a single aggregate query.
+
+    ``counterparty`` nets, per other user, what ``user`` owes on their expenses
+    (``owed``) against what they owe on ``user``'s expenses (``lent``).
+    """
+    if group_by not in SHARE_GROUPS:
+        raise ValueError(f'group_by must be one of {", ".join(SHARE_GROUPS)}')
+
+    if group_by == 'counterparty':
+        rows = shares.filter(
+            Q(user=user) & ~Q(expense__created_by=user) | Q(expense__created_by=user) & ~Q(user=user)
+        ).values(
+            counterparty=Case(When(user=user, then=F('expense__created_by')), default=F('user')),
+        ).annotate(
+            owed=Sum(Case(When(user=user, then=F('amount_cents')), default=Value(0))),
+            lent=Sum(Case(When(expense__created_by=user, then=F('amount_cents')), default=Value(0))),
+            count=Count('expense', distinct=True),
+        ).order_by('counterparty')
+        return [
+            {'counterparty': row['counterparty'], 'owed': _amount(row['owed']), 'lent': _amount(row['lent']),
+             'net': _amount(row['lent'] - row['owed']), 'count': row['count']}
+            for row in rows
+        ]
+
+    name, key = _group_key(group_by, 'expense__')
+    rows = shares.filter(user=user).values(group=key).annotate(
+        total=Sum('amount_cents'), count=Count('id'),
+    ).order_by('group')
+    return [{name: row['group'], 'total': _amount(row['total']), 'count': row['count']} for row in rows]
+
+
+def expense_summary(expenses, group_by):
+    """
+    Total ``expenses`` grouped by ``group_by`` (one of ``EXPENSE_GROUPS``) with a single aggregate query.
+    """
+    if group_by not in EXPENSE_GROUPS:
+        raise ValueError(f'group_by must be one of {", ".join(EXPENSE_GROUPS)}')
+
+    name, key = _group_key(group_by, '')
+    rows = expenses.values(group=key).annotate(
+        total=Sum('total_amount_cents'), count=Count('id'),
+    ).order_by('group')
+    return [{name: row['group'], 'total': _amount(row['total']), 'count': row['count']} for row in rows]
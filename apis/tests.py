@@ -1,7 +1,39 @@
+import json
+import sqlite3
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import ConnectionHandler
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from openpyxl import load_workbook
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Expense, ExpenseShare
+from rest_framework_simplejwt.tokens import AccessToken
+from .idempotency import request_fingerprint
+from .models import Expense, ExpenseShare, ExportJob, IdempotencyKey, UserBalance
+from .pagination import ExpenseShareKeysetPagination
+from .money import split_by_percentages, split_evenly, to_cents
+from .response_cache import response_cache
+from .settlements import minimize_transfers
+from daily_expense_sharing.metrics import registry
+from daily_expense_sharing.routers import ReplicaRouter, reset_routing, route_reads_to_replica
+from users.authentication import user_cache
 
 User = get_user_model()
 
@@ -16,6 +48,8 @@ class ExpenseViewSetTests(APITestCase):
                                               mobile_number='9999988889')
         self.client = APIClient()
         self.client.force_authenticate(user=self.user1)
+        response_cache().clear()
+        user_cache.clear()
 
     def test_create_expense_with_invalid_user_id(self):
         invalid_user_id = '00000000-0000-0000-0000-000000000000'
@@ -50,7 +84,74 @@ class ExpenseViewSetTests(APITestCase):
         self.assertEqual(Expense.objects.count(), 1)
         self.assertEqual(ExpenseShare.objects.count(), 3)
         for expense in ExpenseShare.objects.all():
-            self.assertEqual(expense.amount, 1000.00)
+            self.assertEqual(expense.amount_cents, 100000)
+
+    def test_create_expense_idempotency_key_replays_response(self):
+        data = {
+            "description": "Taxi",
+            "total_amount": "90.00",
+            "split_method": "EQUAL",
+            "shares": [{"user_id": str(self.user1.id)}, {"user_id": str(self.user2.id)}]
+        }
+        first = self.client.post('/api/expenses/', data, format='json', HTTP_IDEMPOTENCY_KEY='taxi-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.client.post('/api/expenses/', data, format='json', HTTP_IDEMPOTENCY_KEY='taxi-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(json.loads(retry.content), json.loads(first.content))
+        self.assertFalse([query for query in queries.captured_queries if 'apis_expense' in query['sql']])
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(UserBalance.objects.get(user=self.user2).total_owed_cents, 4500)
+
+        # Keys are scoped per user, and a key reused for another request is rejected.
+        data['description'] = 'Bus'
+        self.assertEqual(self.client.post('/api/expenses/', data, format='json',
+                                          HTTP_IDEMPOTENCY_KEY='taxi-1').status_code, 422)
+        self.client.force_authenticate(user=self.user2)
+        self.assertEqual(self.client.post('/api/expenses/', data, format='json',
+                                          HTTP_IDEMPOTENCY_KEY='taxi-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_create_expense_idempotency_key_claims_and_expiry(self):
+        data = {
+            "description": "Taxi",
+            "total_amount": "90.00",
+            "split_method": "EQUAL",
+            "shares": [{"user_id": str(self.user1.id)}, {"user_id": str(self.user2.id)}]
+        }
+        # A failed attempt releases its key so the retry runs again.
+        with mock.patch('apis.views.apply_deltas', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/expenses/', data, format='json', HTTP_IDEMPOTENCY_KEY='k')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        # A duplicate of a request that is still running gets 409 once the lock timeout passes.
+        now = timezone.now()
+        IdempotencyKey.objects.create(user=self.user1, key='k', fingerprint=request_fingerprint(
+            SimpleNamespace(method='POST', path='/api/expenses/', data=data)),
+                                      locked_at=now, expires_at=now + timedelta(hours=1))
+        with self.settings(IDEMPOTENCY_LOCK_TIMEOUT=0.1):
+            response = self.client.post('/api/expenses/', data, format='json', HTTP_IDEMPOTENCY_KEY='k')
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+            # ...and a claim older than the timeout is taken over.
+            IdempotencyKey.objects.update(locked_at=now - timedelta(seconds=1))
+            response = self.client.post('/api/expenses/', data, format='json', HTTP_IDEMPOTENCY_KEY='k')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # A request whose claim was taken over while it ran rolls its expense back instead of storing a response.
+        def taken_over(deltas):
+            IdempotencyKey.objects.filter(key='late').update(locked_at=timezone.now() + timedelta(seconds=1))
+
+        with mock.patch('apis.views.apply_deltas', side_effect=taken_over):
+            response = self.client.post('/api/expenses/', data, format='json', HTTP_IDEMPOTENCY_KEY='late')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Expense.objects.count(), 1)
+
+        IdempotencyKey.objects.update(expires_at=now)
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
 
     def test_create_expense_exact_split(self):
         data = {
@@ -66,8 +167,8 @@ class ExpenseViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Expense.objects.count(), 1)
         self.assertEqual(ExpenseShare.objects.count(), 2)
-        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user1.id).first().amount, 1500.00)
-        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user2.id).first().amount, 2500.00)
+        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user1.id).first().amount_cents, 150000)
+        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user2.id).first().amount_cents, 250000)
 
     def test_create_expense_exact_split_with_invalid_amounts(self):
         data = {
@@ -97,8 +198,8 @@ class ExpenseViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Expense.objects.count(), 1)
         self.assertEqual(ExpenseShare.objects.count(), 2)
-        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user1.id).first().amount, 2000.00)
-        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user2.id).first().amount, 3000.00)
+        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user1.id).first().amount_cents, 200000)
+        self.assertEqual(ExpenseShare.objects.filter(user_id=self.user2.id).first().amount_cents, 300000)
 
     def test_create_expense_percentage_split_with_invalid_percentage(self):
         data = {
@@ -115,16 +216,824 @@ class ExpenseViewSetTests(APITestCase):
         self.assertEqual(response.data['error'], 'Total percentage must equal 100%')
 
     def test_my_expenses(self):
-        expense1 = Expense.objects.create(description="Expense 1", total_amount=1000.00, created_by=self.user1,
+        expense1 = Expense.objects.create(description="Expense 1", total_amount_cents=100000, created_by=self.user1,
                                           split_method="EQUAL")
-        ExpenseShare.objects.create(expense=expense1, user=self.user1, amount=500.00)
-        ExpenseShare.objects.create(expense=expense1, user=self.user2, amount=500.00)
+        ExpenseShare.objects.create(expense=expense1, user=self.user1, amount_cents=50000)
+        ExpenseShare.objects.create(expense=expense1, user=self.user2, amount_cents=50000)
 
-        expense2 = Expense.objects.create(description="Expense 2", total_amount=2000.00, created_by=self.user1,
+        expense2 = Expense.objects.create(description="Expense 2", total_amount_cents=200000, created_by=self.user1,
                                           split_method="EXACT")
-        ExpenseShare.objects.create(expense=expense2, user=self.user1, amount=800.00)
-        ExpenseShare.objects.create(expense=expense2, user=self.user3, amount=1200.00)
+        ExpenseShare.objects.create(expense=expense2, user=self.user1, amount_cents=80000)
+        ExpenseShare.objects.create(expense=expense2, user=self.user3, amount_cents=120000)
 
         response = self.client.get('/api/expenses/my_expenses/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_create_expense_reports_all_missing_user_ids(self):
+        missing = ['00000000-0000-0000-0000-000000000001', '00000000-0000-0000-0000-000000000002']
+        data = {
+            "description": "Dinner at restaurant",
+            "total_amount": 3000.00,
+            "split_method": "EQUAL",
+            "shares": [{"user_id": str(self.user1.id)}] + [{"user_id": user_id} for user_id in missing]
+        }
+        response = self.client.post('/api/expenses/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], f'Users with ids {missing[0]}, {missing[1]} do not exist')
+        self.assertEqual(Expense.objects.count(), 0)
+
+    def test_create_expense_query_count_is_constant(self):
+        extra_users = [
+            User.objects.create(email=f'extra{i}@example.com', name=f'extra{i}', mobile_number=f'70000000{i:02d}')
+            for i in range(10)
+        ]
+
+        def post(users):
+            data = {
+                "description": "Trip",
+                "total_amount": 1200.00,
+                "split_method": "EQUAL",
+                "shares": [{"user_id": str(user.id)} for user in users]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/expenses/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(post([self.user1, self.user2]), post([self.user1, self.user2] + extra_users))
+
+    def test_bulk_import_ndjson_reports_row_errors(self):
+        rows = [
+            {"description": "Taxi", "total_amount": 300, "split_method": "EQUAL",
+             "shares": [{"user_id": str(self.user1.id)}, {"user_id": str(self.user2.id)}]},
+            {"description": "Hotel", "total_amount": 1000, "split_method": "EXACT",
+             "shares": [{"user_id": str(self.user1.id), "amount": 400}, {"user_id": str(self.user3.id), "amount": 500}]},
+            "not json",
+            {"description": "Lunch", "total_amount": 500, "split_method": "PERCENTAGE",
+             "shares": [{"user_id": str(self.user2.id), "percentage": 50},
+                        {"user_id": str(self.user3.id), "percentage": 50}]},
+        ]
+        body = '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+        response = self.client.post('/api/expenses/bulk/?chunk_size=2', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(response.data['errors'][0]['error'], 'Total amount must equal 1000.00')
+        self.assertEqual(Expense.objects.count(), 2)
+        self.assertEqual(ExpenseShare.objects.count(), 4)
+
+    def test_bulk_import_csv_groups_shares_by_ref(self):
+        body = '\n'.join([
+            'ref,description,total_amount,split_method,user_id,amount,percentage',
+            f'a,Dinner,90,EQUAL,{self.user1.id},,',
+            f'a,Dinner,90,EQUAL,{self.user2.id},,',
+            f'a,Dinner,90,EQUAL,{self.user3.id},,',
+            f'b,Gift,100,PERCENTAGE,{self.user1.id},,25',
+            f'b,Gift,100,PERCENTAGE,{self.user2.id},,75',
+        ])
+        response = self.client.post('/api/expenses/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 0)
+        gift = Expense.objects.get(description='Gift')
+        self.assertEqual(gift.shares.get(user=self.user2).amount_cents, 7500)
+        self.assertEqual(ExpenseShare.objects.filter(expense__description='Dinner').count(), 3)
+
+    def test_bulk_import_rejects_unsupported_content_type(self):
+        response = self.client.post('/api/expenses/bulk/', '<xml/>', content_type='application/xml')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def _create_expense(self, description, total_amount, created_by, shares, split_method="EXACT"):
+        expense = Expense.objects.create(description=description, total_amount_cents=to_cents(total_amount, 'amount'),
+                                         created_by=created_by, split_method=split_method)
+        for user, amount in shares:
+            ExpenseShare.objects.create(expense=expense, user=user, amount_cents=to_cents(amount, 'amount'))
+        return expense
+
+    def test_balance_sheet_streams_rows_from_one_query(self):
+        self._create_expense("Expense 1", 1000.00, self.user1, [(self.user1, 500.00), (self.user2, 500.00)])
+        self._create_expense("Expense 2", 900.00, self.user2, [(self.user2, 300.00), (self.user3, 600.00)])
+
+        # The conditional GET validator plus the rows themselves.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/expenses/balance_sheet/')
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename=balance_sheet.xlsx')
+
+        rows = list(load_workbook(BytesIO(content), read_only=True).active.values)
+        self.assertEqual(rows[0][0], "Expense Description")
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[4][:6], ("Expense 2", 900, "EXACT", 'user2@example.com', 'user3@example.com', 600))
+
+    def test_my_balance_sheet_only_contains_own_shares(self):
+        self._create_expense("Expense 1", 1000.00, self.user2, [(self.user1, 400.00), (self.user2, 600.00)])
+        self._create_expense("Expense 2", 900.00, self.user2, [(self.user2, 300.00), (self.user3, 600.00)])
+
+        response = self.client.get('/api/expenses/my_balance_sheet/')
+        rows = list(load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True).active.values)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:5], ("Expense 1", 1000, "EXACT", 'user2@example.com', 400))
+
+    def test_balance_sheet_csv_and_ndjson_formats(self):
+        self._create_expense("Expense 1", 1000.00, self.user1, [(self.user1, 500.00), (self.user2, 500.00)])
+
+        response = self.client.get('/api/expenses/balance_sheet/?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Expense Description,Total Amount,Split Method,Created By,User,Amount,Percentage')
+        self.assertEqual(lines[2], 'Expense 1,1000.00,EXACT,user1@example.com,user2@example.com,500.00,')
+
+        response = self.client.get('/api/expenses/my_balance_sheet/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename=my_expense_sheet.ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, [{'description': 'Expense 1', 'total_amount': '1000.00', 'split_method': 'EXACT',
+                                 'created_by': 'user1@example.com', 'amount': '500.00', 'percentage': None}])
+
+        response = self.client.get('/api/expenses/balance_sheet/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response.close()
+        response = self.client.get('/api/expenses/balance_sheet/', {'format': 'csv', 'min_amount': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content), {'detail': 'min_amount must be a number'})
+
+    def test_balance_sheet_filters_by_date_and_creator(self):
+        old = self._create_expense("Old", 100.00, self.user1, [(self.user1, 100.00)])
+        Expense.objects.filter(pk=old.pk).update(created_at=datetime(2024, 1, 15, tzinfo=dt_timezone.utc))
+        self._create_expense("Mine", 200.00, self.user1, [(self.user2, 200.00)])
+        self._create_expense("Theirs", 300.00, self.user2, [(self.user3, 300.00)])
+
+        response = self.client.get('/api/expenses/balance_sheet/', {
+            'format': 'ndjson', 'created_after': '2024-02-01', 'created_by': str(self.user1.id)
+        })
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['description'] for row in rows], ['Mine'])
+
+        response = self.client.get('/api/expenses/balance_sheet/', {'format': 'csv', 'created_before': '2024-01-15'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+
+        response = self.client.get('/api/expenses/balance_sheet/', {'format': 'csv', 'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _post_equal_expense(self, total_amount, users):
+        data = {
+            "description": "Shared",
+            "total_amount": total_amount,
+            "split_method": "EQUAL",
+            "shares": [{"user_id": str(user.id)} for user in users]
+        }
+        response = self.client.post('/api/expenses/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['expense']['id']
+
+    def test_user_balance_follows_create_update_and_delete(self):
+        expense_id = self._post_equal_expense(300.00, [self.user1, self.user2, self.user3])
+        self.assertEqual(UserBalance.objects.get(pk=self.user1.pk).net_cents, 20000)
+        self.assertEqual(UserBalance.objects.get(pk=self.user2.pk).net_cents, -10000)
+
+        response = self.client.patch(f'/api/expenses/{expense_id}/', {'total_amount': 600.00}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(UserBalance.objects.get(pk=self.user1.pk).total_paid_cents, 60000)
+        # The shares are re-split, so they still add up to the new total.
+        self.assertEqual([share['amount'] for share in response.data['shares']], ['200.00'] * 3)
+        self.assertEqual(UserBalance.objects.get(pk=self.user2.pk).total_owed_cents, 20000)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/expenses/my_balance/')
+        self.assertEqual(response.data['net'], '400.00')
+
+        # An exact split needs new amounts when the total changes.
+        shares = [{'user_id': str(self.user1.id), 'amount': '100.00'},
+                  {'user_id': str(self.user2.id), 'amount': '500.00'}]
+        response = self.client.patch(f'/api/expenses/{expense_id}/', {'split_method': 'EXACT', 'shares': shares},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ExpenseShare.objects.filter(expense_id=expense_id).count(), 2)
+        self.assertEqual(UserBalance.objects.get(pk=self.user3.pk).total_owed_cents, 0)
+        response = self.client.patch(f'/api/expenses/{expense_id}/', {'total_amount': 700.00}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Expense.objects.get(pk=expense_id).total_amount_cents, 60000)
+
+        self.client.delete(f'/api/expenses/{expense_id}/')
+        self.assertEqual(UserBalance.objects.get(pk=self.user1.pk).net_cents, 0)
+        self.assertEqual(UserBalance.objects.get(pk=self.user3.pk).total_owed_cents, 0)
+
+    def test_rebuild_balances_command_detects_and_repairs_drift(self):
+        self._post_equal_expense(90.00, [self.user2, self.user3])
+        call_command('rebuild_balances', '--check', stdout=StringIO())
+
+        UserBalance.objects.filter(pk=self.user2.pk).update(net_cents=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_balances', '--check', stdout=StringIO())
+
+        call_command('rebuild_balances', stdout=StringIO())
+        self.assertEqual(UserBalance.objects.get(pk=self.user2.pk).net_cents, -4500)
+        call_command('rebuild_balances', '--check', stdout=StringIO())
+
+    def test_equal_split_hands_out_remainder_cents(self):
+        self.assertEqual(split_evenly(300000, 7), [42858, 42857, 42857, 42857, 42857, 42857, 42857])
+        self.assertEqual(sum(split_evenly(300000, 7)), 300000)
+
+        expense_id = self._post_equal_expense(100.00, [self.user1, self.user2, self.user3])
+        shares = ExpenseShare.objects.filter(expense_id=expense_id).order_by('id')
+        self.assertEqual([share.amount_cents for share in shares], [3334, 3333, 3333])
+        response = self.client.get(f'/api/expenses/{expense_id}/')
+        self.assertEqual([share['amount'] for share in response.data['shares']], ['33.34', '33.33', '33.33'])
+        self.assertEqual(UserBalance.objects.get(pk=self.user1.pk).net_cents, 10000 - 3334)
+
+    def test_percentage_split_uses_largest_remainder(self):
+        self.assertEqual(split_by_percentages(1000, [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')]),
+                         [333, 333, 334])
+        self.assertEqual(split_by_percentages(100, [50, 25, 25]), [50, 25, 25])
+        self.assertEqual(split_by_percentages(1, [50, 50]), [1, 0])
+        self.assertEqual(split_by_percentages(2, [33, 33, 34]), [1, 0, 1])
+
+    def test_materialize_recurring_catches_up_once_per_period(self):
+        response = self.client.post('/api/recurring-expenses/', {
+            "description": "Rent", "total_amount": 100.00, "split_method": "EQUAL", "interval": "MONTHLY",
+            "starts_on": "2024-01-31",
+            "shares": [{"user_id": str(user.id)} for user in (self.user1, self.user2, self.user3)]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        template_id = response.data['id']
+
+        call_command('materialize_recurring', '--until', '2024-05-15', stdout=StringIO())
+        occurrences = Expense.objects.filter(recurring_id=template_id).order_by('occurrence_date')
+        self.assertEqual([str(expense.occurrence_date) for expense in occurrences],
+                         ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30'])
+        # Each occurrence is dated to its period, so date filters and monthly summaries see it there.
+        self.assertEqual([expense.created_at.date() for expense in occurrences],
+                         [expense.occurrence_date for expense in occurrences])
+        response = self.client.get('/api/expenses/total_summary/', {'group_by': 'month'})
+        self.assertEqual([row['period'] for row in response.json()], ['2024-01-01', '2024-02-01', '2024-03-01',
+                                                                      '2024-04-01'])
+        self.assertEqual(self.client.get(f'/api/recurring-expenses/{template_id}/').data['next_occurrence'],
+                         '2024-05-31')
+        self.assertEqual(UserBalance.objects.get(pk=self.user1.pk).net_cents, 4 * (10000 - 3334))
+
+        call_command('materialize_recurring', '--until', '2024-05-15', stdout=StringIO())
+        self.assertEqual(Expense.objects.filter(recurring_id=template_id).count(), 4)
+
+    def test_materialize_recurring_batches_queries(self):
+        for description in ("Coffee", "Parking"):
+            self.client.post('/api/recurring-expenses/', {
+                "description": description, "total_amount": 3.00, "interval": "DAILY", "starts_on": "2020-01-01",
+                "ends_on": "2024-12-31", "shares": [{"user_id": str(self.user1.id)}, {"user_id": str(self.user2.id)}]
+            }, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('materialize_recurring', '--until', '2025-06-01', '--batch-size', '1000', stdout=StringIO())
+        self.assertEqual(Expense.objects.filter(recurring__isnull=False).count(), 2 * 1827)
+        self.assertLess(len(queries), 100)
+        self.assertEqual(UserBalance.objects.get(pk=self.user2.pk).net_cents, -2 * 1827 * 150)
+
+    def test_export_job_builds_file_and_is_deduplicated(self):
+        self._create_expense("Expense 1", 1000.00, self.user1, [(self.user1, 500.00), (self.user2, 500.00)])
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media, EXPORT_JOB_WORKERS=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/exports/', {'kind': 'balance_sheet', 'format': 'csv'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            job_id = response.data['id']
+
+            job = self.client.get(f'/api/exports/{job_id}/').data
+            self.assertEqual((job['status'], job['total_rows'], job['progress']), ('DONE', 2, 1.0))
+            response = self.client.get(job['download_url'])
+            self.assertEqual(response['Content-Disposition'], 'attachment; filename="balance_sheet.csv"')
+            self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
+            response.close()
+
+            response = self.client.post('/api/exports/', {'kind': 'balance_sheet', 'format': 'csv'}, format='json')
+            self.assertEqual((response.status_code, response.data['id']), (status.HTTP_200_OK, job_id))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self._post_equal_expense(90.00, [self.user2, self.user3])
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/exports/', {'kind': 'balance_sheet', 'format': 'csv'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(self.client.get(f"/api/exports/{response.data['id']}/").data['total_rows'], 4)
+
+            # Writes that never bump this process's cache versions (e.g. made by another process) still count.
+            Expense.objects.filter(description="Expense 1").delete()
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/exports/', {'kind': 'balance_sheet', 'format': 'csv'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(self.client.get(f"/api/exports/{response.data['id']}/").data['total_rows'], 2)
+
+            ExportJob.objects.filter(pk=job_id).update(expires_at=datetime(2000, 1, 1, tzinfo=dt_timezone.utc))
+            self.assertEqual(self.client.get(f'/api/exports/{job_id}/download/').status_code, status.HTTP_410_GONE)
+            self.client.post('/api/exports/', {'kind': 'my_balance_sheet'}, format='json')
+            self.assertFalse(ExportJob.objects.filter(pk=job_id).exists())
+            self.assertEqual(len(list((Path(media) / 'exports').iterdir())), 2)
+
+    def test_stale_export_jobs_are_failed_and_not_reused(self):
+        # A job whose worker died stays pending; identical requests reuse it only until EXPORT_JOB_TIMEOUT.
+        with mock.patch('apis.export_jobs.submit_export'), self.captureOnCommitCallbacks(execute=True):
+            job_id = self.client.post('/api/exports/', {'kind': 'balance_sheet'}, format='json').data['id']
+            response = self.client.post('/api/exports/', {'kind': 'balance_sheet'}, format='json')
+        self.assertEqual((response.status_code, response.data['id']), (status.HTTP_200_OK, job_id))
+
+        ExportJob.objects.filter(pk=job_id).update(created_at=datetime(2000, 1, 1, tzinfo=dt_timezone.utc))
+        with mock.patch('apis.export_jobs.submit_export'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/exports/', {'kind': 'balance_sheet'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(ExportJob.objects.get(pk=job_id).status, ExportJob.StatusChoices.FAILED)
+
+        ExportJob.objects.filter(pk=job_id).update(expires_at=datetime(2000, 1, 1, tzinfo=dt_timezone.utc))
+        call_command('purge_exports', stdout=StringIO())
+        self.assertFalse(ExportJob.objects.filter(pk=job_id).exists())
+        self.assertTrue(ExportJob.objects.filter(pk=response.data['id']).exists())
+
+    def test_export_job_rejects_unknown_filters(self):
+        response = self.client.post('/api/exports/', {'kind': 'balance_sheet', 'filters': {'colour': 'red'}},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/exports/', {'kind': 'balance_sheet', 'filters': {'min_amount': 'x'}},
+                                    format='json')
+        self.assertEqual(response.data['filters'], ['min_amount must be a number'])
+
+    def test_generate_statements_writes_one_file_per_user(self):
+        self._create_expense("Expense 1", 1000.00, self.user1, [(self.user1, 500.00), (self.user2, 500.00)])
+        self._create_expense("Expense 2", 900.00, self.user2, [(self.user2, 300.00), (self.user3, 600.00)])
+        with tempfile.TemporaryDirectory() as directory:
+            archive = Path(directory) / 'statements.zip'
+            out = StringIO()
+            call_command('generate_statements', '--output', str(archive), '--format', 'csv', '--workers', '0',
+                         '--batch-size', '2', stdout=out)
+            self.assertIn('Wrote 3 statement(s) (4 rows)', out.getvalue())
+            with zipfile.ZipFile(archive) as statements:
+                self.assertEqual(sorted(statements.namelist()),
+                                 ['user1@example.com.csv', 'user2@example.com.csv', 'user3@example.com.csv'])
+                rows = statements.read('user2@example.com.csv').decode().splitlines()
+        self.assertEqual(rows[1:], ['Expense 1,1000.00,EXACT,user1@example.com,500.00,',
+                                    'Expense 2,900.00,EXACT,user2@example.com,300.00,'])
+
+    def test_admin_action_queues_statements(self):
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='pass1234', name="admin",
+                                                   mobile_number="9876543299")
+        self._create_expense("Expense 1", 1000.00, self.user1, [(self.user1, 500.00), (self.user2, 500.00)])
+        self._create_expense("Expense 2", 90.00, self.user2, [(self.user1, 30.00), (self.user2, 60.00)])
+        self.client.force_login(admin_user)
+        with tempfile.TemporaryDirectory() as media, \
+                self.settings(MEDIA_ROOT=media, EXPORT_JOB_WORKERS=0, STATEMENT_WORKERS=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/admin/users/user/', {
+                    'action': 'generate_statements', '_selected_action': [self.user1.pk, self.user3.pk],
+                })
+            self.assertEqual(response.status_code, 302)
+            job = ExportJob.objects.get(kind=ExportJob.KindChoices.STATEMENTS)
+            self.assertEqual((job.status, job.rows_written, job.total_rows), (ExportJob.StatusChoices.DONE, 2, 2))
+
+            response = self.client.get(f'/admin/apis/exportjob/{job.pk}/download/')
+            with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as statements:
+                self.assertEqual(statements.namelist(), ['user1@example.com.xlsx'])
+            response.close()
+
+    def test_summaries_aggregate_in_one_query(self):
+        june = self._create_expense("June", 1000.00, self.user2, [(self.user1, 400.00), (self.user2, 600.00)])
+        july = self._create_expense("July", 300.00, self.user1, [(self.user1, 100.00), (self.user2, 200.00)])
+        other = self._create_expense("Other", 50.00, self.user3, [(self.user1, 50.00)], split_method="EQUAL")
+        Expense.objects.filter(pk=june.pk).update(created_at=datetime(2024, 6, 10, tzinfo=dt_timezone.utc))
+        Expense.objects.filter(pk__in=[july.pk, other.pk]).update(
+            created_at=datetime(2024, 7, 3, tzinfo=dt_timezone.utc))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/expenses/my_summary/', {'group_by': 'month'})
+            query_count = len(queries)
+        self.assertEqual(response.json(), [
+            {'period': '2024-06-01', 'total': '400.00', 'count': 1},
+            {'period': '2024-07-01', 'total': '150.00', 'count': 2},
+        ])
+        self.assertEqual(query_count, 1)
+
+        response = self.client.get('/api/expenses/my_summary/', {'group_by': 'counterparty'})
+        self.assertEqual(sorted((row['counterparty'], row['owed'], row['lent'], row['net']) for row in response.json()),
+                         sorted([(str(self.user2.pk), '400.00', '200.00', '-200.00'),
+                                 (str(self.user3.pk), '50.00', '0.00', '-50.00')]))
+
+        response = self.client.get('/api/expenses/total_summary/', {'group_by': 'split_method'})
+        self.assertEqual(response.json(), [{'split_method': 'EQUAL', 'total': '50.00', 'count': 1},
+                                           {'split_method': 'EXACT', 'total': '1300.00', 'count': 2}])
+        response = self.client.get('/api/expenses/total_summary/', {'group_by': 'week', 'created_after': '2024-07-01'})
+        self.assertEqual(response.json(), [{'period': '2024-07-01', 'total': '350.00', 'count': 2}])
+
+        response = self.client.get('/api/expenses/total_summary/', {'group_by': 'counterparty'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _search(self, text, **params):
+        response = self.client.get('/api/expenses/', {'search': text, 'fields': 'description', **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['description'] for row in response.data['results']]
+
+    def test_search_ranks_the_users_expenses(self):
+        self._create_expense("Goa flights", 100.00, self.user2, [(self.user1, 100.00)])
+        self._create_expense("Hotel in Goa", 100.00, self.user1, [(self.user2, 100.00)])
+        self._create_expense("Hotel Mumbai", 100.00, self.user2, [(self.user3, 100.00)])
+        taxi = self._create_expense("Taxi", 100.00, self.user1, [(self.user1, 100.00)])
+
+        self.assertEqual(self._search("that hotel in Goa"), ["Hotel in Goa", "Goa flights"])
+        self.assertEqual(self._search("hot"), ["Hotel in Goa"])
+        self.assertEqual(self._search('"; DROP'), [])
+        self.assertEqual(self._search('"'), [])
+        self.assertEqual(self._search('!!!'), [])
+
+        first = self.client.get('/api/expenses/', {'search': 'goa', 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual([len(first['results']), len(second['results']), second['next']], [1, 1, None])
+        self.assertNotEqual(first['results'][0]['id'], second['results'][0]['id'])
+
+        Expense.objects.filter(pk=taxi.pk).update(description="Airport taxi in Goa")
+        self.assertIn("Airport taxi in Goa", self._search("airport"))
+        taxi.delete()
+        self.assertEqual(self._search("airport"), [])
+
+    def test_rebuild_search_index_restores_triggers_and_rows(self):
+        self._create_expense("Hotel in Goa", 100.00, self.user1, [(self.user1, 100.00)])
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO apis_expense_fts (apis_expense_fts) VALUES ('delete-all')")
+            cursor.execute('DROP TRIGGER apis_expense_fts_insert')
+        self.assertEqual(self._search("goa"), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self._create_expense("Goa flights", 100.00, self.user1, [(self.user1, 100.00)])
+        self.assertEqual(sorted(self._search("goa")), ["Goa flights", "Hotel in Goa"])
+
+    def test_migrate_restores_dropped_search_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER apis_expense_fts_insert')
+        self._create_expense("Hotel in Goa", 100.00, self.user1, [(self.user1, 100.00)])
+        self.assertEqual(self._search("goa"), [])
+
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self._search("goa"), ["Hotel in Goa"])
+        self._create_expense("Goa flights", 100.00, self.user1, [(self.user1, 100.00)])
+        self.assertEqual(sorted(self._search("goa")), ["Goa flights", "Hotel in Goa"])
+
+    def test_minimize_transfers_settles_every_balance(self):
+        balances = {'a': 5000, 'b': -3000, 'c': -1500, 'd': -500, 'e': 0}
+        transfers = minimize_transfers(balances)
+        self.assertEqual(transfers[0], ('b', 'a', 3000))
+        self.assertLessEqual(len(transfers), 3)
+        for debtor, creditor, cents in transfers:
+            balances[debtor] += cents
+            balances[creditor] -= cents
+        self.assertEqual(set(balances.values()), {0})
+
+    def test_settlements_endpoint(self):
+        self._post_equal_expense(300.00, [self.user1, self.user2, self.user3])
+        response = self.client.get('/api/expenses/settlements/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(
+            [(row['from_user'], row['to_user'], row['amount']) for row in response.json()],
+            [(str(self.user2.id), str(self.user1.id), '100.00'), (str(self.user3.id), str(self.user1.id), '100.00')]
+        )
+
+    def test_expense_list_keyset_pagination(self):
+        created_at = datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+        for i in range(5):
+            expense = self._create_expense(f"Expense {i}", 100.00, self.user1, [(self.user1, 100.00)])
+            Expense.objects.filter(pk=expense.pk).update(created_at=created_at if i < 3 else created_at.replace(day=2))
+
+        for url in ('/api/expenses/', '/api/expenses/total_expenses/', '/api/expenses/my_expenses/'):
+            seen, next_url = [], f'{url}?page_size=2'
+            while next_url:
+                response = self.client.get(next_url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertLessEqual(len(response.data['results']), 2)
+                seen.extend(row['id'] for row in response.data['results'])
+                next_url = response.data['next']
+            self.assertEqual(len(seen), 5)
+            self.assertEqual(len(set(seen)), 5)
+
+        response = self.client.get('/api/expenses/')
+        self.assertEqual([row['description'] for row in response.data['results']],
+                         ["Expense 4", "Expense 3", "Expense 2", "Expense 1", "Expense 0"])
+        self.assertEqual(self.client.get('/api/expenses/?cursor=bogus').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expense_list_query_count_is_constant(self):
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/expenses/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self._create_expense("Expense 1", 100.00, self.user1, [(self.user1, 50.00), (self.user2, 50.00)])
+        baseline = list_queries()
+        for i in range(5):
+            self._create_expense(f"More {i}", 90.00, self.user2,
+                                 [(self.user1, 30.00), (self.user2, 30.00), (self.user3, 30.00)])
+        self.assertEqual(list_queries(), baseline)
+        self.assertEqual(baseline, 3)
+
+    def test_expense_list_sparse_fields_and_flat_relations(self):
+        self._create_expense("Expense 1", 100.00, self.user1, [(self.user2, 100.00)])
+
+        response = self.client.get('/api/expenses/', {'fields': 'id,description,created_by,shares', 'expand': ''})
+        row = response.json()['results'][0]
+        self.assertEqual(set(row), {'id', 'description', 'created_by', 'shares'})
+        self.assertEqual(row['created_by'], str(self.user1.id))
+        self.assertEqual(row['shares'][0]['user'], str(self.user2.id))
+
+        response = self.client.get('/api/expenses/', {'expand': 'shares.user'})
+        row = response.json()['results'][0]
+        self.assertEqual(row['created_by'], str(self.user1.id))
+        self.assertEqual(row['shares'][0]['user']['email'], 'user2@example.com')
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/expenses/', {'fields': 'id,description'})
+        self.assertEqual(response.json()['results'], [{'id': row['id'], 'description': "Expense 1"}])
+
+    def test_cached_reads_make_no_queries_until_an_expense_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._post_equal_expense(100.00, [self.user1, self.user2])
+
+        for url in ('/api/expenses/my_expenses/', '/api/expenses/total_expenses/',
+                    '/api/expenses/my_balance_sheet/?format=csv'):
+            first = self.client.get(url)
+            first_content = b''.join(first.streaming_content) if first.streaming else first.content
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first_content)
+            self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._post_equal_expense(50.00, [self.user1, self.user3])
+        self.assertEqual(len(self.client.get('/api/expenses/my_expenses/').data['results']), 2)
+        self.assertEqual(len(self.client.get('/api/expenses/total_expenses/').data['results']), 2)
+
+    def test_cache_is_per_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._post_equal_expense(100.00, [self.user1, self.user2])
+        self.assertEqual(len(self.client.get('/api/expenses/my_expenses/').data['results']), 1)
+
+        self.client.force_authenticate(user=self.user3)
+        self.assertEqual(len(self.client.get('/api/expenses/my_expenses/').data['results']), 0)
+
+    def test_conditional_get_returns_not_modified(self):
+        expense = self._create_expense("Expense 1", 100.00, self.user1, [(self.user1, 100.00)])
+
+        for url in ('/api/expenses/', f'/api/expenses/{expense.id}/', '/api/expenses/balance_sheet/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(f'/api/expenses/{expense.id}/')
+        self.assertEqual(self.client.get(f'/api/expenses/{expense.id}/',
+                                         HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get('/api/expenses/').get('ETag')
+        self._create_expense("Expense 2", 100.00, self.user2, [(self.user2, 100.00)])
+        self.assertEqual(self.client.get('/api/expenses/', HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+
+    def test_collection_is_modified_after_deleting_an_older_expense(self):
+        older = self._create_expense("Expense 1", 100.00, self.user1, [(self.user1, 100.00)])
+        self._create_expense("Expense 2", 100.00, self.user1, [(self.user1, 100.00)])
+        response = self.client.get('/api/expenses/')
+        self.assertNotIn('Last-Modified', response)
+        since = http_date(timezone.now().timestamp() + 60)
+
+        older.delete()
+        response = self.client.get('/api/expenses/', HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual((response.status_code, len(response.data['results'])), (status.HTTP_200_OK, 1))
+
+    def test_cached_response_revalidates_without_queries(self):
+        self._create_expense("Expense 1", 100.00, self.user2, [(self.user1, 100.00)])
+        etag = self.client.get('/api/expenses/my_expenses/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/expenses/my_expenses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_expense_list_filters(self):
+        self._create_expense("Small", 50.00, self.user1, [(self.user1, 50.00)])
+        self._create_expense("Large", 5000.00, self.user2, [(self.user2, 5000.00)], split_method="EQUAL")
+
+        def descriptions(params):
+            response = self.client.get('/api/expenses/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [row['description'] for row in response.data['results']]
+
+        self.assertEqual(descriptions({'created_by': str(self.user2.id)}), ["Large"])
+        self.assertEqual(descriptions({'split_method': 'EXACT'}), ["Small"])
+        self.assertEqual(descriptions({'min_amount': '100'}), ["Large"])
+        self.assertEqual(descriptions({'max_amount': '100', 'created_after': '2000-01-01'}), ["Small"])
+        self.assertEqual(descriptions({'created_before': '2000-01-01'}), [])
+        self.assertEqual(self.client.get('/api/expenses/', {'split_method': 'HALF'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_queries_use_composite_indexes(self):
+        created_after = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+        plan = Expense.objects.filter(created_by=self.user1, created_at__gte=created_after) \
+            .order_by('-created_at', '-id').explain()
+        self.assertIn('expense_creator_created_idx', plan)
+
+        plan = Expense.objects.filter(created_at__gte=created_after).order_by('-created_at', '-id').explain()
+        self.assertIn('expense_created_id_idx', plan)
+
+        plan = ExpenseShare.objects.filter(user=self.user1).values_list('expense_id', flat=True).explain()
+        self.assertIn('share_user_expense_idx', plan)
+
+        # A deep my_expenses page seeks the index to the cursor instead of sorting all of the user's shares.
+        cursor = ExpenseShareKeysetPagination().encode_cursor(100, 200)
+        shares, _ = ExpenseShareKeysetPagination().page_queryset(
+            ExpenseShare.objects.filter(user=self.user1).select_related('expense'), {'cursor': cursor})
+        plan = shares.explain()
+        self.assertIn('share_user_expense_idx (user_id=? AND expense_id<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_request_metrics_and_server_timing(self):
+        registry.clear()
+        self._create_expense("Expense 1", 100.00, self.user1, [(self.user1, 100.00)])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/expenses/')
+        query_count = len(queries)
+        self.assertIn(f'desc="{query_count} queries"', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+        response = self.client.get('/api/expenses/balance_sheet/?format=csv')
+        size = len(b''.join(response.streaming_content))
+
+        # Only staff users and allow-listed scrapers may read the metrics.
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+        self.user1.is_staff = True
+        self.user1.save()
+        self.client.force_login(self.user1)
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_serialize_duration_seconds_count{view="expense-list"} 1', metrics)
+        self.assertIn('# TYPE http_request_db_queries histogram', metrics)
+        self.assertIn(f'http_request_db_queries_bucket{{view="expense-list",le="{float(query_count)!r}"}} 1', metrics)
+        self.assertIn('http_request_db_queries_count{view="expense-list"} 1', metrics)
+        self.assertIn(f'http_response_size_bytes_sum{{view="expense-balance-sheet"}} {float(size)!r}', metrics)
+        self.assertNotIn('view="metrics"', metrics)
+
+    def test_async_read_views_match_sync_views(self):
+        self._post_equal_expense(90.00, [self.user1, self.user2, self.user3])
+        expense = self._create_expense("Expense 2", 100.00, self.user2, [(self.user1, 100.00)])
+        async_client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user1)}')
+
+        for sync_path, async_path in [
+            ('/api/expenses/?page_size=1', '/api/async/expenses/?page_size=1'),
+            ('/api/expenses/my_expenses/?expand=', '/api/async/expenses/my_expenses/?expand='),
+            (f'/api/expenses/{expense.id}/?fields=id,shares', f'/api/async/expenses/{expense.id}/?fields=id,shares'),
+            ('/api/expenses/my_balance/', '/api/async/expenses/my_balance/'),
+            ('/api/expenses/settlements/', '/api/async/expenses/settlements/'),
+        ]:
+            expected = self.client.get(sync_path).json()
+            response = async_client.get(async_path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, async_path)
+            if 'next' in expected:
+                self.assertEqual(response.json()['results'], expected['results'])
+                self.assertEqual(response.json()['next'] is None, expected['next'] is None)
+            else:
+                self.assertEqual(response.json(), expected)
+
+    def test_async_read_view_errors(self):
+        response = APIClient().get('/api/async/expenses/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user1)}')
+        self.assertEqual(client.get('/api/async/expenses/', {'cursor': 'bogus'}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(client.get('/api/async/expenses/', {'split_method': 'HALF'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get('/api/async/expenses/999/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(client.post('/api/async/expenses/').status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_async_view_under_asgi(self):
+        await sync_to_async(self._create_expense)("Expense 1", 100.00, self.user2, [(self.user1, 100.00)])
+        token = AccessToken.for_user(self.user1)
+
+        response = await self.async_client.get('/api/async/expenses/my_expenses/',
+                                               headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_production_sqlite_backend_pragmas_and_immediate_transactions(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = f'{workdir}/db.sqlite3'
+            handler = ConnectionHandler({'default': {'ENGINE': 'daily_expense_sharing.sqlite_backend', 'NAME': path}})
+            tuned = handler['default']
+            try:
+                with tuned.cursor() as cursor:
+                    pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                               for name in ('journal_mode', 'busy_timeout', 'synchronous')}
+                self.assertEqual(pragmas, {'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 1})
+
+                # The write lock is taken when the transaction begins, before anything is written.
+                tuned._start_transaction_under_autocommit()
+                other = sqlite3.connect(path, timeout=0)
+                with self.assertRaisesRegex(sqlite3.OperationalError, 'locked'):
+                    other.execute('BEGIN IMMEDIATE')
+                other.close()
+                tuned.rollback()
+            finally:
+                handler.close_all()
+
+    def test_replica_router_pins_reads_after_a_write(self):
+        router = ReplicaRouter()
+        reset_routing()
+        with self.settings(DATABASE_REPLICA_ALIAS='default'):
+            self.assertIsNone(router.db_for_read(Expense))
+            route_reads_to_replica()
+            self.assertEqual(router.db_for_read(Expense), 'default')
+            self.assertEqual(router.db_for_write(Expense), 'default')
+            self.assertIsNone(router.db_for_read(Expense))
+            reset_routing()
+
+            self.assertEqual(self.client.get('/api/expenses/').status_code, status.HTTP_200_OK)
+            self.assertIsNone(router.db_for_read(Expense))
+        route_reads_to_replica()
+        self.assertIsNone(router.db_for_read(Expense))
+        reset_routing()
+
+    def test_read_only_actions_route_to_replica(self):
+        seen = []
+        original = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = original(router, model, **hints)
+            seen.append((self.action, alias))
+            return alias
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', record), \
+                self.settings(DATABASE_REPLICA_ALIAS='default'):
+            self.action = 'balance_sheet'
+            b''.join(self.client.get('/api/expenses/balance_sheet/').streaming_content)
+            self.action = 'my_expenses'
+            self.client.get('/api/expenses/my_expenses/')
+            self.action = 'create'
+            self._post_equal_expense(30.00, [self.user1, self.user2])
+        self.assertIn(('balance_sheet', 'default'), seen)
+        # Cached responses are built from the primary, so a lagging replica is never cached under a new version.
+        self.assertNotIn(('my_expenses', 'default'), seen)
+        self.assertNotIn(('create', 'default'), seen)
+
+
+class SearchIndexMigrationTests(TransactionTestCase):
+    def test_search_index_migration_can_be_unapplied_and_reapplied(self):
+        # Unapplying the later rebuilds of apis_expense drops the sync triggers before 0009 is reached.
+        call_command('migrate', 'apis', '0008_exportjob_statements', verbosity=0)
+        self.assertNotIn('apis_expense_fts', connection.introspection.table_names())
+
+        call_command('migrate', verbosity=0)
+        self.assertIn('apis_expense_fts', connection.introspection.table_names())
+        user = User.objects.create_user(email='user1@example.com', password='pass1234', name="user1",
+                                        mobile_number="9876543210")
+        Expense.objects.create(description="Hotel in Goa", total_amount_cents=10000, split_method='EQUAL', created_by=user)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM apis_expense_fts WHERE apis_expense_fts MATCH 'goa'")
+            self.assertEqual(len(cursor.fetchall()), 1)
+
+    def test_created_at_migration_keeps_search_triggers_in_both_directions(self):
+        # Without post_migrate, as in the middle of a longer migration plan.
+        triggers = ['apis_expense_fts_delete', 'apis_expense_fts_insert', 'apis_expense_fts_update']
+        for target in ['0010_idempotencykey', '0011_expense_created_at_default']:
+            executor = MigrationExecutor(connection)
+            executor.migrate([('apis', target)])
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'apis_expense' "
+                               "ORDER BY name")
+                self.assertEqual([name for name, in cursor.fetchall()], triggers)
+
+
+class MoneyMigrationTests(TransactionTestCase):
+    def test_legacy_splits_are_resplit_to_add_up(self):
+        legacy = ('apis', '0004_expense_filter_indexes')
+        executor = MigrationExecutor(connection)
+        executor.migrate([legacy])
+        apps = executor.loader.project_state(legacy).apps
+        LegacyExpense, LegacyShare = apps.get_model('apis', 'Expense'), apps.get_model('apis', 'ExpenseShare')
+        users = [User.objects.create_user(email=f'user{i}@example.com', password='pass1234', name=f"user{i}",
+                                          mobile_number=f"987654321{i}") for i in range(3)]
+        equal = LegacyExpense.objects.create(description="Equal", total_amount=Decimal('100.00'),
+                                             split_method='EQUAL', created_by_id=users[0].pk)
+        percentage = LegacyExpense.objects.create(description="Percentage", total_amount=Decimal('10.00'),
+                                                  split_method='PERCENTAGE', created_by_id=users[0].pk)
+        for user, share_percentage in zip(users, ['33.33', '33.33', '33.34']):
+            LegacyShare.objects.create(expense=equal, user_id=user.pk, amount=Decimal('33.33'))
+            LegacyShare.objects.create(expense=percentage, user_id=user.pk, amount=Decimal('3.33'),
+                                       percentage=Decimal(share_percentage))
+        # Rebuild the legacy ledger from the rows above.
+        executor = MigrationExecutor(connection)
+        executor.migrate([('apis', '0002_initial')])
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        def amounts(expense):
+            return list(ExpenseShare.objects.filter(expense_id=expense.pk).order_by('pk')
+                        .values_list('amount_cents', flat=True))
+
+        self.assertEqual(amounts(equal), [3334, 3333, 3333])
+        self.assertEqual(amounts(percentage), [333, 333, 334])
+        call_command('rebuild_balances', '--check', stdout=StringIO())
+        self.assertEqual(UserBalance.objects.get(user=users[0]).net_cents, 11000 - 3334 - 333)
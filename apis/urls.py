@@ -1,10 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ExpenseViewSet
+from . import async_views
+from .views import ExpenseViewSet, ExportJobViewSet, RecurringExpenseViewSet
 
 router = DefaultRouter()
 router.register(r'expenses', ExpenseViewSet, basename='expense')
+router.register(r'recurring-expenses', RecurringExpenseViewSet, basename='recurring-expense')
+router.register(r'exports', ExportJobViewSet, basename='export-job')
 
 urlpatterns = [
+    path('async/expenses/', async_views.expense_list, name='async-expense-list'),
+    path('async/expenses/my_expenses/', async_views.my_expenses, name='async-expense-my-expenses'),
+    path('async/expenses/my_balance/', async_views.my_balance, name='async-expense-my-balance'),
+    path('async/expenses/settlements/', async_views.settlements, name='async-expense-settlements'),
+    path('async/expenses/<int:pk>/', async_views.expense_detail, name='async-expense-detail'),
     path('', include(router.urls)),
 ]
@@ -1,180 +1,378 @@
-from io import BytesIO
-
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.http import HttpResponse
-from openpyxl.workbook import Workbook
-from rest_framework import viewsets, status
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from django.http import FileResponse
+from rest_framework import mixins, serializers, viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Expense, ExpenseShare
-from .serializers import ExpenseSerializer, ExpenseCreateSerializer, ExpenseShareSerializer
+from daily_expense_sharing.routers import route_reads_to_replica
+from .balances import apply_deltas, compute_balances, expense_deltas
+from .conditional import conditional_get
+from .export_jobs import download_name, request_export
+from .exports import (
+    BALANCE_SHEET_FIELDS, BALANCE_SHEET_HEADERS, MY_BALANCE_SHEET_FIELDS, MY_BALANCE_SHEET_HEADERS, balance_sheet_rows,
+    export_response, my_balance_sheet_rows
+)
+from .filters import ExpenseFilterBackend
+from .idempotency import idempotent_response
+from .imports import import_expenses, rows_from_stream
+from .models import Expense, ExpenseShare, ExportJob, RecurringExpense, UserBalance
+from .money import cents_to_decimal
+from .pagination import ExpenseShareKeysetPagination, KeysetPagination, SearchRankPagination
+from .renderers import EXPORT_RENDERERS, json_errors
+from .response_cache import GLOBAL_SCOPE, USER_SCOPE, bump_data_versions, cached_response
+from .serializers import (
+    ExpenseSerializer, ExpenseCreateSerializer, ExpenseShareSerializer, ExportJobSerializer,
+    RecurringExpenseSerializer, UserBalanceSerializer, parse_field_list
+)
+from .search import participating, search_expenses
+from .settlements import minimize_transfers
+from .splits import build_shares, existing_user_ids, share_payloads
+from .summaries import expense_summary, share_summary
 
 User = get_user_model()
 
 
+def expense_read_queryset(queryset, fields=None, expand=None):
+    """
+    Eager-load the relations ExpenseSerializer will render for the given
+    ``?fields=`` and ``?expand=`` selection, so serializing a page costs a fixed
+    number of queries.
+    """
+    if (fields is None or 'created_by' in fields) and (expand is None or 'created_by' in expand):
+        queryset = queryset.select_related('created_by')
+    if fields is None or 'shares' in fields:
+        shares = ExpenseShare.objects.order_by('id')
+        if expand is None or 'shares.user' in expand:
+            shares = shares.select_related('user')
+        queryset = queryset.prefetch_related(Prefetch('shares', queryset=shares))
+    return queryset
+
+
+def settlement_payload(totals):
+    """
+    Turn ``compute_balances`` totals into the fewest transfers that settle every balance.
+    """
+    balances = {user_id: paid - owed for user_id, (paid, owed) in totals.items()}
+    return [
+        {'from_user': debtor, 'to_user': creditor, 'amount': str(cents_to_decimal(cents))}
+        for debtor, creditor, cents in minimize_transfers(balances)
+    ]
+
+
 class ExpenseViewSet(viewsets.ModelViewSet):
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [ExpenseFilterBackend]
+    # Read-only and export actions, which may be served from the read replica. Actions behind cached_response read
+    # the primary instead, see apis.response_cache.
+    replica_actions = {'list', 'retrieve', 'balance_sheet', 'my_balance', 'settlements'}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        route_reads_to_replica(self.action in self.replica_actions)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        return json_errors(super().finalize_response(request, response, *args, **kwargs))
 
     def get_serializer_class(self):
         if self.action == 'create':
             return ExpenseCreateSerializer
         return ExpenseSerializer
 
-    @transaction.atomic
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = parse_field_list(self.request.query_params.get('fields'))
+        context['expand'] = parse_field_list(self.request.query_params.get('expand'))
+        return context
+
+    def is_expanded(self, relation):
+        expand = parse_field_list(self.request.query_params.get('expand'))
+        return expand is None or relation in expand
+
+    def get_queryset(self):
+        return self.expense_read_queryset(Expense.objects.all())
+
+    def expense_read_queryset(self, queryset):
+        return expense_read_queryset(queryset, parse_field_list(self.request.query_params.get('fields')),
+                                     parse_field_list(self.request.query_params.get('expand')))
+
+    def get_validator_queryset(self):
+        """
+        Return the rows, and their last-modified field, whose changes invalidate
+        this action's response. Used by ``conditional_get``.
+        """
+        if self.action == 'retrieve':
+            return Expense.objects.filter(pk=self.kwargs['pk']), 'updated_at'
+        if self.action == 'list':
+            expenses = self.filter_queryset(Expense.objects.all())
+            if self.request.query_params.get('search'):
+                expenses = participating(expenses, self.request.user)
+            return expenses, 'updated_at'
+
+        shares = self.filter_queryset(ExpenseShare.objects.all())
+        if self.action in ('my_expenses', 'my_balance_sheet'):
+            shares = shares.filter(user=self.request.user)
+        return shares, 'expense__updated_at'
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search')
+        if search:
+            return self.search(request, search)
+        return super().list(request, *args, **kwargs)
+
+    def search(self, request, text):
+        """
+        Full-text search over the descriptions of the expenses the user takes part in, best match first.
+        """
+        expenses = search_expenses(self.filter_queryset(self.get_queryset()), text, request.user)
+        paginator = SearchRankPagination()
+        page = paginator.paginate_queryset(expenses, request, view=self)
+        serializer = ExpenseSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
+        """
+        Create an expense. With an ``Idempotency-Key`` header, retries of the same
+        request replay the stored response instead of creating another expense.
+        """
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return self.create_expense(request)
+        return idempotent_response(request, key, self.create_expense)
+
+    @transaction.atomic
+    def create_expense(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         users = data.get('shares')
-        total_amount = data.get('total_amount')
-        split_method = data.get('split_method')
+        total_cents = data.get('total_amount_cents')
+        split_method = data.get('split_method') or Expense.SplitMethodChoices.EQUAL
         description = data.get('description')
         created_by = request.user
 
+        try:
+            known_user_ids = existing_user_ids(share.get('user_id') for share in users if isinstance(share, dict))
+            shares = build_shares(total_cents, split_method, users, known_user_ids)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         expense = Expense.objects.create(
             description=description,
-            total_amount=total_amount,
+            total_amount_cents=total_cents,
             created_by=created_by,
             split_method=split_method
         )
+        for share in shares:
+            share.expense = expense
+        ExpenseShare.objects.bulk_create(shares)
+        deltas = expense_deltas([(expense, shares)])
+        apply_deltas(deltas)
+        bump_data_versions(deltas)
 
-        try:
-            for user in users:
-                if not User.objects.filter(id=user['user_id']).exists():
-                    raise ValueError(f"User with id {user['user_id']} does not exist")
-
-            if split_method == Expense.SplitMethodChoices.EQUAL:
-                amount_per_user = total_amount / len(users)
-                for user in users:
-                    user_instance = User.objects.get(id=user['user_id'])
-                    ExpenseShare.objects.create(
-                        expense=expense,
-                        user=user_instance,
-                        amount=amount_per_user
-                    )
-
-            elif split_method == Expense.SplitMethodChoices.EXACT:
-                amount = sum([share['amount'] for share in users])
-                if amount != total_amount:
-                    raise ValueError(f'Total amount must equal {total_amount}')
-                for share in users:
-                    user_instance = User.objects.get(id=share['user_id'])
-                    amount = share['amount']
-                    ExpenseShare.objects.create(
-                        expense=expense,
-                        user=user_instance,
-                        amount=amount
-                    )
-
-            elif split_method == Expense.SplitMethodChoices.PERCENTAGE:
-                total_percentage = sum([share['percentage'] for share in users])
-                if total_percentage != 100:
-                    raise ValueError('Total percentage must equal 100%')
-                for share in users:
-                    user_instance = User.objects.get(id=share['user_id'])
-                    percentage = share['percentage']
-                    amount = (total_amount * percentage) / 100
-                    ExpenseShare.objects.create(
-                        expense=expense,
-                        user=user_instance,
-                        amount=amount,
-                        percentage=percentage
-                    )
-
-        except (User.DoesNotExist, ValueError) as e:
-            transaction.set_rollback(True)
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
+        prefetch_related_objects([expense], Prefetch('shares', queryset=ExpenseShare.objects.select_related('user')))
         return Response({
             'message': 'Expense created successfully',
             'expense': ExpenseSerializer(expense).data
         }, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        """
+        Save the expense and, when its total, split method or ``shares`` change,
+        re-split it so the shares keep adding up to the total.
+
+        Without ``shares`` in the request the expense is re-split among the same
+        users with their stored percentages or amounts.
+        """
+        instance = serializer.instance
+        shares = list(instance.shares.all())
+        deltas = expense_deltas([(instance, shares)], sign=-1)
+
+        data = serializer.validated_data
+        payload = self.request.data.get('shares')
+        total_cents = data.get('total_amount_cents', instance.total_amount_cents)
+        split_method = data.get('split_method', instance.split_method)
+        resplit = payload is not None or total_cents != instance.total_amount_cents \
+            or split_method != instance.split_method
+        if resplit:
+            if payload is None:
+                payload = share_payloads(shares)
+            elif not isinstance(payload, list):
+                raise serializers.ValidationError({'shares': 'shares must be a list'})
+            try:
+                known_user_ids = existing_user_ids(share.get('user_id') for share in payload if isinstance(share, dict))
+                new_shares = build_shares(total_cents, split_method, payload, known_user_ids)
+            except ValueError as e:
+                raise serializers.ValidationError({'error': str(e)})
+
+        expense = serializer.save()
+        if resplit:
+            ExpenseShare.objects.filter(expense=expense).delete()
+            for share in new_shares:
+                share.expense = expense
+            shares = ExpenseShare.objects.bulk_create(new_shares)
+        apply_deltas(expense_deltas([(expense, shares)], deltas=deltas))
+        bump_data_versions(deltas)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        deltas = expense_deltas([(instance, instance.shares.all())], sign=-1)
+        apply_deltas(deltas)
+        bump_data_versions(deltas)
+        instance.delete()
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_import(self, request):
+        rows = rows_from_stream(request.stream, request.content_type)
+        if rows is None:
+            return Response({'error': 'Upload must be application/x-ndjson or text/csv'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        chunk_size = getattr(settings, 'EXPENSE_BULK_CHUNK_SIZE', 1000)
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', chunk_size))
+        except ValueError:
+            return Response({'error': 'chunk_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        chunk_size = max(1, min(chunk_size, getattr(settings, 'EXPENSE_BULK_MAX_CHUNK_SIZE', 10000)))
+
+        report = import_expenses(rows, request.user, chunk_size, getattr(settings, 'EXPENSE_BULK_MAX_ERRORS', 1000))
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def my_balance(self, request):
+        balance = UserBalance.objects.filter(pk=request.user.pk).first() or UserBalance(user=request.user)
+        return Response(UserBalanceSerializer(balance).data)
+
+    @action(detail=False, methods=['get'])
+    def settlements(self, request):
+        return Response(settlement_payload(compute_balances()))
+
     @action(detail=False, methods=['get'])
+    @cached_response(USER_SCOPE)
+    @conditional_get
     def my_expenses(self, request):
         user = request.user
-        expenses_shares = ExpenseShare.objects.filter(user=user)
-        serializer = ExpenseShareSerializer(expenses_shares, many=True)
-        return Response(serializer.data)
+        expenses_shares = self.filter_queryset(ExpenseShare.objects.filter(user=user)).select_related('expense')
+        if self.is_expanded('user'):
+            expenses_shares = expenses_shares.select_related('user')
+        paginator = ExpenseShareKeysetPagination()
+        page = paginator.paginate_queryset(expenses_shares, request, view=self)
+        serializer = ExpenseShareSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cached_response(GLOBAL_SCOPE)
     def total_expenses(self, request):
-        expenses = Expense.objects.all()
-        serializer = ExpenseSerializer(expenses, many=True)
-        return Response(serializer.data)
+        expenses = self.expense_read_queryset(self.filter_queryset(Expense.objects.all()))
+        page = self.paginate_queryset(expenses)
+        serializer = ExpenseSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
-    def balance_sheet(self, request):
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Balance Sheet"
-
-        headers = [
-            "Expense Description", "Total Amount", "Split Method", "Created By",
-            "User", "Amount", "Percentage"
-        ]
-        sheet.append(headers)
-
-        expenses = Expense.objects.all()
-        for expense in expenses:
-            shares = ExpenseShare.objects.filter(expense=expense)
-            for share in shares:
-                row = [
-                    expense.description,
-                    expense.total_amount,
-                    expense.split_method,
-                    expense.created_by.email,
-                    share.user.email,
-                    share.amount,
-                    getattr(share, 'percentage', 'N/A')
-                ]
-                sheet.append(row)
-
-        buffer = BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-
-        response = HttpResponse(buffer,
-                                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=balance_sheet.xlsx'
-        return response
+    @cached_response(USER_SCOPE)
+    def my_summary(self, request):
+        """
+        What the logged-in user owes, totalled per ``?group_by=`` day, week, month,
+        creator, split_method or counterparty.
+        """
+        shares = self.filter_queryset(ExpenseShare.objects.all())
+        try:
+            rows = share_summary(shares, request.user, request.query_params.get('group_by', 'month'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(rows)
 
     @action(detail=False, methods=['get'])
+    @cached_response(GLOBAL_SCOPE)
+    def total_summary(self, request):
+        """
+        Expense totals per ``?group_by=`` day, week, month, creator or split_method.
+        """
+        expenses = self.filter_queryset(Expense.objects.all())
+        try:
+            rows = expense_summary(expenses, request.query_params.get('group_by', 'month'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(rows)
+
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS)
+    @conditional_get
+    def balance_sheet(self, request):
+        rows = balance_sheet_rows(self.filter_queryset(ExpenseShare.objects.all()))
+        return export_response(request.accepted_renderer.format, 'balance_sheet', "Balance Sheet",
+                               BALANCE_SHEET_HEADERS, BALANCE_SHEET_FIELDS, rows)
+
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS)
+    @cached_response(USER_SCOPE)
+    @conditional_get
     def my_balance_sheet(self, request):
-        user = request.user
-        expense_shares = ExpenseShare.objects.filter(user=user)
-
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "My Expense Sheet"
-
-        headers = [
-            "Expense Description", "Total Amount", "Split Method", "Created By",
-            "Amount", "Percentage"
-        ]
-        sheet.append(headers)
-
-        for share in expense_shares:
-            expense = share.expense
-            row = [
-                expense.description,
-                expense.total_amount,
-                expense.split_method,
-                expense.created_by.email,
-                share.amount,
-                getattr(share, 'percentage', 'N/A')
-            ]
-            sheet.append(row)
-
-        buffer = BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-
-        response = HttpResponse(buffer,
-                                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=my_expense_sheet.xlsx'
-        return response
+        rows = my_balance_sheet_rows(request.user, self.filter_queryset(ExpenseShare.objects.all()))
+        return export_response(request.accepted_renderer.format, 'my_expense_sheet', "My Expense Sheet",
+                               MY_BALANCE_SHEET_HEADERS, MY_BALANCE_SHEET_FIELDS, rows)
+
+
+class RecurringExpenseViewSet(viewsets.ModelViewSet):
+    """
+    The logged-in user's recurring expense templates. Their expenses are created
+    by ``manage.py materialize_recurring``.
+    """
+    serializer_class = RecurringExpenseSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringExpense.objects.filter(created_by=self.request.user).order_by('id')
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    Balance sheet exports built by a background worker instead of the request thread.
+
+    POST a ``kind``, ``format`` and optional ``filters``; poll the job until its
+    status is ``DONE`` and fetch the file from ``download_url``.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(requested_by=self.request.user).order_by('-created_at')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        job, created = request_export(request.user, data['kind'], data.get('format', ExportJob.FormatChoices.XLSX),
+                                      data['filters'])
+        return Response(self.get_serializer(job).data,
+                        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.StatusChoices.DONE:
+            return Response({'error': f'Export is {job.status.lower()}'}, status=status.HTTP_409_CONFLICT)
+        if job.expires_at <= timezone.now():
+            return Response({'error': 'Export has expired'}, status=status.HTTP_410_GONE)
+        filename, content_type = download_name(job)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=filename, content_type=content_type)
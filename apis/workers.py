@@ -0,0 +1,19 @@
+"""
+Bootstrap for worker processes started with the ``spawn`` or ``forkserver`` method.
+
+This module must not import models: the pool loads it before Django is set up.
+"""
+import os
+
+
+def setup_django_worker(settings_module, database_name):
+    """
+    Set up Django in a fresh worker process against the parent's database file.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    import django
+    django.setup()
+
+    from django.db import connections
+    # The parent may be using a scratch or test database rather than the configured one.
+    connections['default'].settings_dict['NAME'] = database_name
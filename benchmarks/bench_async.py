@@ -0,0 +1,168 @@
+"""
+Compare throughput of the sync ExpenseViewSet reads with their async counterparts under ASGI.
+
+    python benchmarks/bench_async.py --requests 2000 --concurrency 100 --client-delay 0.05
+
+Requests go to ``daily_expense_sharing.asgi.application``. With ``--server uvicorn``
+(needs ``pip install uvicorn``) they are sent over real sockets to a uvicorn
+server running in this process; the default ``asgi`` server speaks the ASGI
+protocol to the application directly. ``--client-delay`` makes every client
+wait that long before reading its response body, like a slow mobile client.
+"""
+import argparse
+import asyncio
+import random
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import scratch_database, setup_django
+
+ENDPOINTS = {
+    'list': ('/api/expenses/', '/api/async/expenses/'),
+    'my_expenses': ('/api/expenses/my_expenses/', '/api/async/expenses/my_expenses/'),
+    'my_balance': ('/api/expenses/my_balance/', '/api/async/expenses/my_balance/'),
+    'settlements': ('/api/expenses/settlements/', '/api/async/expenses/settlements/'),
+}
+
+
+def asgi_fetcher(application, client_delay):
+    async def fetch(path, token):
+        status, requested, finished = None, False, asyncio.Event()
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if client_delay:
+                    await asyncio.sleep(client_delay)
+            elif not message.get('more_body'):
+                finished.set()
+
+        await application({
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }, receive, send)
+        return status
+    return fetch
+
+
+def socket_fetcher(port, client_delay):
+    async def fetch(path, token):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: testserver\r\nAuthorization: Bearer {token}\r\n'
+                     f'Connection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        if client_delay:
+            await asyncio.sleep(client_delay)
+        await reader.read()
+        writer.close()
+        await writer.wait_closed()
+        return int(status_line.split()[1])
+    return fetch
+
+
+async def drive(fetch, path, tokens, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, peak_threads = [], threading.active_count()
+
+    async def one(token):
+        nonlocal peak_threads
+        async with semaphore:
+            started = time.perf_counter()
+            status = await fetch(path, token)
+            latencies.append(time.perf_counter() - started)
+            peak_threads = max(peak_threads, threading.active_count())
+            assert status == 200, (path, status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(tokens[i % len(tokens)]) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        'rps': requests / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': statistics.quantiles(latencies, n=100)[98] * 1000,
+        'threads': peak_threads,
+    }
+
+
+async def run(args, tokens):
+    from daily_expense_sharing.asgi import application
+
+    server = None
+    if args.server == 'uvicorn':
+        import uvicorn
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=port, lifespan='off',
+                                               log_level='warning', backlog=4096))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        fetch = socket_fetcher(port, args.client_delay)
+    else:
+        fetch = asgi_fetcher(application, args.client_delay)
+
+    try:
+        results = {}
+        for name in args.endpoints.split(','):
+            sync_path, async_path = ENDPOINTS[name]
+            await drive(fetch, sync_path, tokens, min(50, args.requests), args.concurrency)
+            results[name] = {
+                'sync': await drive(fetch, sync_path, tokens, args.requests, args.concurrency),
+                'async': await drive(fetch, async_path, tokens, args.requests, args.concurrency),
+            }
+        return results
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await serving
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--expenses', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--client-delay', type=float, default=0.0)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--server', choices=['asgi', 'uvicorn'], default='asgi')
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from apis.management.commands.bench import seed
+    from users.models import User
+
+    with tempfile.TemporaryDirectory() as workdir, scratch_database(str(Path(workdir) / 'bench.sqlite3')):
+        user_ids = seed(args.users, args.expenses, 4, random.Random(0))
+        tokens = [str(AccessToken.for_user(User(pk=user_id))) for user_id in user_ids]
+        results = asyncio.run(run(args, tokens))
+
+    print(f'{args.server} server, {args.concurrency} concurrent clients, {args.client_delay * 1000:.0f} ms client delay')
+    for name, modes in results.items():
+        for mode, result in modes.items():
+            print(f'{name:>12} {mode:>5}: {result["rps"]:8.1f} req/s  p50 {result["p50_ms"]:8.1f} ms  '
+                  f'p99 {result["p99_ms"]:8.1f} ms  peak threads {result["threads"]}')
+
+
+if __name__ == '__main__':
+    main()
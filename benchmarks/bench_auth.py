@@ -0,0 +1,59 @@
+"""
+Compare request throughput under Basic, plain JWT and cached JWT authentication.
+
+    python benchmarks/bench_auth.py --requests 500
+"""
+import argparse
+import base64
+import time
+
+from common import scratch_database, setup_django
+
+
+def measure(client, path, requests, **headers):
+    client.get(path, **headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, **headers)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.authentication import BasicAuthentication
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from apis.views import ExpenseViewSet
+    from users.authentication import CachedJWTAuthentication
+
+    with scratch_database():
+        user = get_user_model().objects.create_user(email='bench@example.com', password='bench-password',
+                                                    name='bench', mobile_number='9000000000')
+        basic = 'Basic ' + base64.b64encode(b'bench@example.com:bench-password').decode()
+        bearer = f'Bearer {AccessToken.for_user(user)}'
+        path = '/api/expenses/my_balance/'
+        client = APIClient()
+
+        results = {}
+        for name, authentication, header in [
+            ('basic', BasicAuthentication, basic),
+            ('jwt', JWTAuthentication, bearer),
+            ('cached_jwt', CachedJWTAuthentication, bearer),
+        ]:
+            ExpenseViewSet.authentication_classes = [authentication]
+            results[name] = measure(client, path, args.requests, HTTP_AUTHORIZATION=header)
+
+        for name, rps in results.items():
+            print(f'{name:>10}: {rps:8.1f} req/s  ({rps / results["basic"]:.1f}x basic)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Time the settlement engine on synthetic balances.
+
+    python benchmarks/bench_settlements.py --users 100000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from apis.settlements import minimize_transfers  # noqa: E402
+
+
+def synthetic_balances(users, seed):
+    rng = random.Random(seed)
+    balances = {user: rng.randint(-500_000, 500_000) for user in range(users - 1)}
+    balances[users - 1] = -sum(balances.values())
+    return balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    balances = synthetic_balances(args.users, args.seed)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        transfers = minimize_transfers(balances)
+        timings.append(time.perf_counter() - started)
+
+    assert len(transfers) < args.users
+    print(f'users={args.users} transfers={len(transfers)} '
+          f'best={min(timings) * 1000:.1f}ms worst={max(timings) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Stress concurrent expense writers under the development and production database profiles.
+
+    python benchmarks/bench_sqlite_writers.py --requests 200 --concurrency 1,8,16
+
+Each profile runs ``manage.py bench --endpoints create`` in its own process,
+against a file-backed scratch database, and the writer throughput and the
+share of requests that failed (on SQLite, with "database is locked") are
+compared.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PROFILES = ['development', 'production']
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        output = Path(workdir) / 'report.json'
+        subprocess.run(
+            [sys.executable, str(ROOT / 'manage.py'), 'bench', '--endpoints', 'create', '--users', str(args.users),
+             '--expenses', str(args.expenses), '--requests', str(args.requests),
+             '--concurrency', args.concurrency, '--cache', 'cold', '--output', str(output)],
+            env={**os.environ, 'DATABASE_PROFILE': profile}, check=True, stderr=subprocess.DEVNULL,
+        )
+        return json.loads(output.read_text())['endpoints']['cold']['create']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--expenses', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', default='1,8,16')
+    args = parser.parse_args()
+
+    for profile in PROFILES:
+        for level, result in run_profile(profile, args).items():
+            print(f'{profile:>12} x{level:>3}: {result["throughput_rps"]:8.1f} writes/s  '
+                  f'{result["errors"] / result["requests"]:6.1%} errors  p99 {result["p99_ms"]:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Measure statement generation throughput for a growing number of worker processes.
+
+    python benchmarks/bench_statements.py --users 2000 --expenses 20000 --workers 0,1,2,4,8
+"""
+import argparse
+import os
+import random
+import tempfile
+from pathlib import Path
+
+from common import scratch_database, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--expenses', type=int, default=10000)
+    parser.add_argument('--shares', type=int, default=4)
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--workers', default=','.join(str(n) for n in (0, 1, 2, 4, os.cpu_count())
+                                                      if n <= os.cpu_count()))
+    args = parser.parse_args()
+
+    setup_django()
+    from apis.management.commands.bench import seed
+    from apis.statements import generate_statements
+
+    with tempfile.TemporaryDirectory() as workdir, scratch_database(str(Path(workdir) / 'bench.sqlite3')):
+        seed(args.users, args.expenses, args.shares, random.Random(0))
+        print(f'{os.cpu_count()} CPU(s), {args.users} users, {args.expenses * args.shares} rows, {args.format}')
+        baseline = None
+        for workers in sorted({int(n) for n in args.workers.split(',')}):
+            report = generate_statements(Path(workdir) / 'statements.zip', args.format, workers, args.batch_size)
+            baseline = baseline or report['statements_per_second']
+            print(f'{workers:>3} worker(s): {report["statements_per_second"]:8.1f} statements/s  '
+                  f'{report["seconds"]:6.2f}s  x{report["statements_per_second"] / baseline:.2f}')
+
+
+if __name__ == '__main__':
+    main()
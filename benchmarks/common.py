@@ -0,0 +1,37 @@
+"""
+Helpers for benchmarks that need a configured Django project and a scratch database.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'daily_expense_sharing.settings')
+
+
+def setup_django():
+    import django
+    django.setup()
+
+
+@contextmanager
+def scratch_database(name=None):
+    """
+    Run the block against a freshly migrated test database that is dropped afterwards.
+
+    Pass a file ``name`` when the benchmark opens connections from several threads.
+    """
+    from django.db import connection
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+        teardown_test_environment
+
+    if name:
+        connection.settings_dict['TEST']['NAME'] = name
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,112 @@
+import bisect
+import math
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS = {
+    'http_request_duration_seconds': (
+        'Wall time spent handling a request, including streaming its body.', TIME_BUCKETS),
+    'http_request_db_queries': ('Database queries run per request.', COUNT_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent executing SQL per request.', TIME_BUCKETS),
+    'http_request_serialize_duration_seconds': (
+        'Time spent in serializers per request, excluding the SQL they run.', TIME_BUCKETS),
+    'http_request_render_duration_seconds': (
+        'Time spent rendering or generating the response body per request.', TIME_BUCKETS),
+    'http_response_size_bytes': ('Size of the response body.', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return '+Inf' if value == math.inf else repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    In-process histograms of the ``METRICS`` above, one series per view.
+
+    Each worker process keeps its own registry; Prometheus sums the series of
+    every scraped worker.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, values):
+        """
+        Record one request's ``{metric: value}`` measurements for ``view``.
+        """
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, view))
+                if histogram is None:
+                    histogram = self._histograms[name, view] = Histogram(self.metrics[name][1])
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Return every series in the Prometheus text exposition format.
+        """
+        with self._lock:
+            snapshot = {key: (list(histogram.counts), histogram.total, histogram.count)
+                        for key, histogram in self._histograms.items()}
+
+        lines = []
+        for name, (help_text, buckets) in self.metrics.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (metric, view), (counts, total, count) in sorted(snapshot.items()):
+                if metric != name:
+                    continue
+                label = f'view="{_escape(view)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{label},le="{_number(bound)}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label}}} {_number(total)}')
+                lines.append(f'{name}_count{{{label}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """
+    Serve the histograms to staff users and to scrapers from ``METRICS_ALLOWED_IPS``.
+    """
+    allowed = request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not allowed and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,207 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import registry
+
+_current_timer = ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """
+    Per-request accumulator of query count, SQL time, serialization time and render time.
+    """
+    __slots__ = ('started', 'queries', 'sql', 'serialize', 'render', 'serializing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that charges each query to the current request's timer.
+
+    The timer is looked up through a context variable rather than installed per
+    request, because async views run their queries on connections that belong
+    to other threads; ``sync_to_async`` carries the context variable there.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.sql += time.perf_counter() - started
+        timer.queries += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        # Outermost, and below any wrapper pushed by ``connection.execute_wrapper()``.
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Charge the block's time, less the SQL it runs, to the current request's serialization time.
+
+    Nested blocks (nested serializers) are only charged once, to the outermost.
+    """
+    timer = _current_timer.get()
+    if timer is None or timer.serializing:
+        yield
+        return
+    timer.serializing = True
+    started, sql = time.perf_counter(), timer.sql
+    try:
+        yield
+    finally:
+        timer.serialize += time.perf_counter() - started - (timer.sql - sql)
+        timer.serializing = False
+
+
+class TimedSerializerMixin:
+    """
+    Record a DRF serializer's ``to_representation`` time as the request's serialization time.
+    """
+
+    def to_representation(self, instance):
+        with measure_serialization():
+            return super().to_representation(instance)
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure query count, SQL time, serialization time, render time and response
+    size of every request, report them in a ``Server-Timing`` header and record them in the
+    ``/metrics`` histograms.
+
+    Streaming bodies (e.g. the spreadsheet exports) are produced after the
+    headers are sent, so their generation time and size only reach the
+    histograms, once the stream is exhausted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported missed connection_created.
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = request._request_timer = RequestTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self.process_response(request, timer, response)
+
+    async def __acall__(self, request):
+        timer = request._request_timer = RequestTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self.process_response(request, timer, response)
+
+    def process_template_response(self, request, response):
+        timer = request._request_timer
+        render_started = time.perf_counter()
+
+        def rendered(response):
+            timer.render += time.perf_counter() - render_started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, timer, response):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if view == 'metrics':
+            return response
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={timer.sql * 1000:.2f};desc="{timer.queries} queries", '
+                f'serialize;dur={timer.serialize * 1000:.2f}, '
+                f'render;dur={timer.render * 1000:.2f}, '
+                f'total;dur={(time.perf_counter() - timer.started) * 1000:.2f}'
+            )
+        if not response.streaming:
+            self.observe(view, timer, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.observe_async_stream(view, timer, response.streaming_content)
+        else:
+            response.streaming_content = self.observe_stream(view, timer, response.streaming_content)
+        return response
+
+    def observe_stream(self, view, timer, content):
+        size = 0
+        iterator = iter(content)
+        try:
+            while True:
+                chunk_started = time.perf_counter()
+                token = _current_timer.set(timer)
+                try:
+                    chunk = next(iterator, None)
+                finally:
+                    _current_timer.reset(token)
+                timer.render += time.perf_counter() - chunk_started
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(view, timer, size)
+
+    async def observe_async_stream(self, view, timer, content):
+        size = 0
+        iterator = aiter(content)
+        try:
+            while True:
+                chunk_started = time.perf_counter()
+                token = _current_timer.set(timer)
+                try:
+                    chunk = await anext(iterator, None)
+                finally:
+                    _current_timer.reset(token)
+                timer.render += time.perf_counter() - chunk_started
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(view, timer, size)
+
+    def observe(self, view, timer, size):
+        registry.observe(view, {
+            'http_request_duration_seconds': time.perf_counter() - timer.started,
+            'http_request_db_queries': timer.queries,
+            'http_request_db_duration_seconds': timer.sql,
+            'http_request_serialize_duration_seconds': timer.serialize,
+            'http_request_render_duration_seconds': timer.render,
+            'http_response_size_bytes': size,
+        })
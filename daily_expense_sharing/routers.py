@@ -0,0 +1,62 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+
+PRIMARY = 'default'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_alias():
+    """
+    Return the configured replica alias, or None when no replica database is set up.
+    """
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def route_reads_to_replica(enabled=True):
+    """
+    Send the current request's reads to the replica, until it writes or finishes.
+    """
+    _replica_reads.set(enabled)
+
+
+def reset_routing(**kwargs):
+    _replica_reads.set(False)
+    _pinned_to_primary.set(False)
+
+
+request_started.connect(reset_routing, dispatch_uid='reset_database_routing_started')
+request_finished.connect(reset_routing, dispatch_uid='reset_database_routing_finished')
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica while ``route_reads_to_replica`` is in effect and
+    every write to the primary. Once a request has written, its later reads
+    stick to the primary so it always sees its own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _pinned_to_primary.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        _pinned_to_primary.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema along with its data from the primary.
+        if db == replica_alias() and db != PRIMARY:
+            return False
+        return None
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'daily_expense_sharing.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,6 +92,67 @@ DATABASES = {
     }
 }
 
+# DATABASE_PROFILE=production switches to the tuned SQLite backend (WAL, busy timeout, BEGIN IMMEDIATE, see
+# daily_expense_sharing/sqlite_backend) and keeps connections open between requests.
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'development')
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'daily_expense_sharing.sqlite_backend',
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# DATABASE_REPLICA_NAME points a read-only replica at a copy of the primary (for SQLite, a second file kept in sync by
+# e.g. litestream or LiteFS). Read-only and export actions then read from it, see daily_expense_sharing/routers.py.
+DATABASE_REPLICA_ALIAS = 'replica'
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['daily_expense_sharing.routers.ReplicaRouter']
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+#
+# 'expense_responses' holds cached read responses and per-user data versions. With locmem both live in each
+# process, so a write made in another process (another web worker, or a management command such as
+# materialize_recurring or rebuild_balances) never invalidates this one's cached responses. Locmem is therefore only
+# for a single web process with no other writers; otherwise set EXPENSE_CACHE_BACKEND=file (one host) or redis (any
+# Redis-compatible server, configured with an LRU maxmemory-policy). The redis backend needs the optional redis-py
+# package (pip install redis), which requirements.txt does not install.
+
+RESPONSE_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'expense-responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'responses')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+EXPENSE_CACHE_BACKEND = os.environ.get('EXPENSE_CACHE_BACKEND', 'locmem')
+if EXPENSE_CACHE_BACKEND not in RESPONSE_CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"EXPENSE_CACHE_BACKEND must be one of {', '.join(RESPONSE_CACHE_BACKENDS)}")
+if EXPENSE_CACHE_BACKEND == 'redis' and importlib.util.find_spec('redis') is None:
+    raise ImproperlyConfigured('EXPENSE_CACHE_BACKEND=redis requires the redis package: pip install redis')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'expense_responses': {
+        'BACKEND': RESPONSE_CACHE_BACKENDS[EXPENSE_CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('EXPENSE_CACHE_LOCATION', RESPONSE_CACHE_BACKENDS[EXPENSE_CACHE_BACKEND][1]),
+        'TIMEOUT': 300,
+    },
+}
+if EXPENSE_CACHE_BACKEND != 'redis':
+    # Once MAX_ENTRIES is reached, locmem evicts the least recently used entries; the file backend deletes a
+    # random third of them (CULL_FREQUENCY), whichever they are.
+    CACHES['expense_responses']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('EXPENSE_CACHE_MAX_ENTRIES', 5000))}
+
+EXPENSE_RESPONSE_CACHE = 'expense_responses'
+EXPENSE_RESPONSE_CACHE_TIMEOUT = 300
+EXPENSE_RESPONSE_CACHE_MAX_BYTES = 1024 * 1024
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -121,6 +187,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded and generated files, e.g. the background exports
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -133,6 +202,41 @@ AUTHENTICATION_BACKENDS = ['users.auth_backend.EmailBackend']
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     )
 }
+
+# Authenticated users are cached in-process for this many seconds after their token is verified
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_CACHE_SIZE = 10000
+
+# Participant typeahead (GET /account/users/search/): largest ?limit= and how long results are cached, in seconds
+USER_SEARCH_MAX_LIMIT = 20
+USER_SEARCH_CACHE_TIMEOUT = 30
+
+# Bulk expense import (POST /api/expenses/bulk/)
+EXPENSE_BULK_CHUNK_SIZE = 1000
+EXPENSE_BULK_MAX_CHUNK_SIZE = 10000
+EXPENSE_BULK_MAX_ERRORS = 1000
+
+# Idempotency-Key on POST /api/expenses/: how long responses are kept for replay (manage.py purge_idempotency_keys
+# deletes expired ones) and how long a duplicate waits for the request holding its key
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 10
+
+# Background balance sheet exports (/api/exports/): worker threads per process (0 runs jobs inline once the request
+# commits) and how long finished files are kept
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_TTL = 60 * 60
+# Pending or running jobs older than this are marked failed (manage.py purge_exports runs the cleanup periodically)
+EXPORT_JOB_TIMEOUT = 30 * 60
+
+# Worker processes for statement zips queued from the admin. They run beside the web server, so keep this small;
+# manage.py generate_statements takes --workers instead (default one per CPU)
+STATEMENT_WORKERS = int(os.environ.get('STATEMENT_WORKERS', 2))
+
+# Request instrumentation (daily_expense_sharing.middleware); histograms are served on /metrics
+METRICS_SERVER_TIMING = True
+# /metrics is served to staff users and to these client addresses (e.g. the Prometheus scraper), comma separated
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
@@ -0,0 +1,45 @@
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative sizes are in KiB, so this is a 64 MiB page cache per connection.
+    'cache_size': -64 * 1024,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend for concurrent web traffic.
+
+    Every new connection applies ``DEFAULT_PRAGMAS``, updated with the
+    ``pragmas`` dict in ``OPTIONS``. In WAL mode readers never block the writer
+    and the writer never blocks readers. Transactions start with
+    ``BEGIN IMMEDIATE``, so a writer takes the write lock up front and waits
+    for it through ``busy_timeout``. A deferred transaction instead fails with
+    "database is locked" when it tries to upgrade its read lock while another
+    connection is writing. Set ``OPTIONS['begin_immediate']`` to ``False`` to
+    restore deferred transactions.
+    """
+    backend_options = ('pragmas', 'begin_immediate')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in self.backend_options:
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.settings_dict['OPTIONS'].get('begin_immediate', True):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
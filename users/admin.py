@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.urls import reverse
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from apis.export_jobs import request_statements
+
 from .models import User
 
 
@@ -25,6 +29,16 @@ class EmailUserAdmin(UserAdmin):
     search_fields = ('email', 'first_name', 'last_name')
     ordering = ('email',)
     filter_horizontal = ('groups', 'user_permissions',)
+    actions = ['generate_statements']
+
+    @admin.action(description=_('Generate expense statements for the selected users'))
+    def generate_statements(self, request, queryset):
+        job = request_statements(request.user, queryset.values_list('pk', flat=True))[0]
+        url = reverse('admin:apis_exportjob_change', args=[job.pk])
+        self.message_user(request, format_html(
+            'Statements are being generated in the background; download them from <a href="{}">export job {}</a>.',
+            url, job.pk,
+        ))
 
 
 admin.site.register(User, EmailUserAdmin)
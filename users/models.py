@@ -4,6 +4,7 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.contrib.auth.base_user import BaseUserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import ValidationError
 import re
@@ -60,6 +61,14 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        # Expression indexes for the case-insensitive prefix search in users.search; mobile_number is covered by its
+        # unique index.
+        indexes = [
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+            models.Index(Lower('name'), name='user_name_lower_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db.models.functions import Lower
+
+MAX_QUERY_LENGTH = 100
+
+# Searched in this order; on equal match quality a user found through an earlier field ranks first.
+SEARCH_FIELDS = ('email', 'name', 'mobile_number')
+
+
+def _next_prefix(prefix):
+    """
+    Return the smallest string greater than every string starting with ``prefix``.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix_matches(field, prefix, limit):
+    """
+    Return up to ``limit`` active users whose ``field`` starts with ``prefix``, in index order.
+
+    The prefix is matched as the range ``prefix <= key < next prefix`` on the
+    indexed key (``lower(email)``, ``lower(name)`` or ``mobile_number``), which
+    every backend can answer with an index range scan that stops after ``limit`` rows.
+    """
+    users = get_user_model().objects.filter(is_active=True)
+    if field == 'mobile_number':
+        key = field
+    else:
+        key = f'{field}_key'
+        users = users.alias(**{key: Lower(field)})
+    return list(users.filter(**{
+        f'{key}__gte': prefix, f'{key}__lt': _next_prefix(prefix),
+    }).order_by(key).values('id', 'name', 'email', 'mobile_number')[:limit])
+
+
+def search_users(text, limit):
+    """
+    Return up to ``limit`` ``{id, name, email}`` rows for active users whose email,
+    name or mobile number starts with ``text``, ignoring case.
+
+    Exact matches come first, then shorter matching values, then ``SEARCH_FIELDS``
+    order. Every field is read with its own bounded index range scan.
+    """
+    prefix = text.strip().lower()[:MAX_QUERY_LENGTH]
+    if not prefix:
+        return []
+
+    ranked = {}
+    for position, field in enumerate(SEARCH_FIELDS):
+        for row in _prefix_matches(field, prefix, limit):
+            value = row[field].lower()
+            rank = (value != prefix, len(value), position, value)
+            if row['id'] not in ranked or rank < ranked[row['id']][0]:
+                ranked[row['id']] = (rank, row)
+    return [
+        {'id': row['id'], 'name': row['name'], 'email': row['email']}
+        for rank, row in sorted(ranked.values(), key=lambda entry: entry[0])[:limit]
+    ]
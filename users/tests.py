@@ -1,5 +1,10 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from apis.response_cache import response_cache
+
+from .authentication import user_cache
 
 
 class UserCreationTest(TestCase):
@@ -46,4 +51,73 @@ class UserCreationTest(TestCase):
         invalid_data = self.user_data.copy()
         invalid_data['name'] = None
         with self.assertRaises(Exception):
-            self.user_model.objects.create_user(**invalid_data)
\ No newline at end of file
+            self.user_model.objects.create_user(**invalid_data)
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(email='jwt@example.com', password='testpassword123',
+                                                         name='JWT User', mobile_number='9876543210')
+        response = self.client.post('/account/token/obtain/', {'email': 'jwt@example.com',
+                                                               'password': 'testpassword123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_token_requests_use_cached_user(self):
+        self.assertEqual(self.client.get('/api/expenses/my_balance/').status_code, 200)
+        with self.assertNumQueries(1):
+            # Only the balance lookup itself; the user comes from the cache.
+            response = self.client.get('/api/expenses/my_balance/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_saving_user_invalidates_cache(self):
+        self.client.get('/api/expenses/my_balance/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/expenses/my_balance/').status_code, 401)
+
+
+class UserSearchTest(APITestCase):
+    def setUp(self):
+        response_cache().clear()
+        users = get_user_model().objects
+        self.user = users.create_user(email='searcher@example.com', password='testpassword123',
+                                      name='Searcher', mobile_number='9000000000')
+        self.ann = users.create_user(email='ann@example.com', password='testpassword123',
+                                     name='Annabel Lee', mobile_number='9811111111')
+        self.anna = users.create_user(email='Anna.K@example.com', password='testpassword123',
+                                      name='Anna', mobile_number='9822222222')
+        self.bob = users.create_user(email='bob@example.com', password='testpassword123',
+                                     name='Annette Bob', mobile_number='8933333333')
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params):
+        response = self.client.get('/account/users/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_prefix_matches_are_ranked_and_minimal(self):
+        response = self.search(q='ANNA')
+        # The exact name match first, then shorter matching values.
+        self.assertEqual([row['email'] for row in response.data], ['Anna.K@example.com', 'ann@example.com'])
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'email'})
+        self.assertEqual([row['name'] for row in self.search(q='ann').data], ['Anna', 'Annabel Lee', 'Annette Bob'])
+        self.assertEqual([row['name'] for row in self.search(q='98').data], ['Annabel Lee', 'Anna'])
+        self.assertEqual(self.search(q='').data, [])
+
+    def test_limit_and_inactive_users(self):
+        self.assertEqual(len(self.search(q='ann', limit=2).data), 2)
+        self.assertEqual(self.client.get('/account/users/search/', {'q': 'ann', 'limit': 'x'}).status_code, 400)
+        self.ann.is_active = False
+        self.ann.save()
+        self.assertNotIn('ann@example.com', [row['email'] for row in self.search(q='annabel').data])
+
+    def test_results_are_cached_briefly(self):
+        response = self.search(q='bob')
+        self.assertIn('max-age=30', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search(q='bob').data, response.data)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/account/users/search/', {'q': 'ann'}).status_code, 401)
@@ -1,10 +1,19 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils.cache import patch_cache_control
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from apis.response_cache import response_cache
+
+from .search import search_users
 from .serializers import UserSerializer, TokenObtainPairSerializer
 
 
@@ -33,3 +42,30 @@ class AccountViewSet(viewsets.ModelViewSet):
     """
     serializer_class = UserSerializer
     queryset = Users.objects.all()
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def search(self, request):
+        """
+        Typeahead for share participants: ``?q=`` prefix-matches email, name and
+        mobile number and returns at most ``?limit=`` ranked ``{id, name, email}`` rows.
+        """
+        max_limit = getattr(settings, 'USER_SEARCH_MAX_LIMIT', 20)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), max_limit)
+        except ValueError:
+            return Response(status=HTTP_400_BAD_REQUEST, data={'error': 'limit must be an integer'})
+        if limit < 1:
+            return Response(status=HTTP_400_BAD_REQUEST, data={'error': 'limit must be positive'})
+
+        query = request.query_params.get('q', '').strip().lower()
+        max_age = getattr(settings, 'USER_SEARCH_CACHE_TIMEOUT', 30)
+        # Results do not depend on who asks, so every user shares the cached rows for a query.
+        key = f'user-search:{limit}:{hashlib.md5(query.encode()).hexdigest()}'
+        results = response_cache().get(key)
+        if results is None:
+            results = search_users(query, limit)
+            response_cache().set(key, results, timeout=max_age)
+
+        response = Response(results)
+        patch_cache_control(response, private=True, max_age=max_age)
+        return response